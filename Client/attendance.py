@@ -1,10 +1,12 @@
 import os
-import cv2
+import time
 import json
 import pickle
+import threading
+import importlib
 import numpy as np
-import face_recognition
 from datetime import datetime
+from log_writer import JsonLinesWriter, read_json_lines
 
 
 # ================================================================================
@@ -15,7 +17,7 @@ DEBUG = False
 JSON_FOLDER = 'Jsons'
 MODEL_FOLDER = 'Models'
 
-attendance_log_file = os.path.join('Jsons', 'attendance_log.json')
+attendance_log_file = os.path.join('Jsons', 'attendance_log.jsonl')
 class_register_file = os.path.join('Jsons', 'class.json')
 
 # ================================================================================
@@ -28,6 +30,49 @@ register = {}
 known_face_encodings = []
 known_face_reg_no = []
 
+# Append-only writer for the per-image logs (created in init):
+log_writer = None
+
+# Heavy libraries, imported by load_libraries (the client starts it in the
+# background, so the imports overlap the connection with the server):
+cv2 = None
+face_recognition = None
+libraries_lock = threading.Lock()
+
+# Speed / accuracy profiles for the recognition pipeline (server picks one per session):
+#   resize: frame scale factor before detection
+#   upsample: times the HOG detector upsamples the image (finds smaller faces)
+#   landmark_model: 'small' (5 points, faster) or 'large' (68 points)
+#   jitters: re-samplings while encoding (slower, more stable encodings)
+#   tolerance: max face distance to count as a match (lower is stricter)
+RECOGNITION_PROFILES = {
+    'fast': {'resize': 0.25, 'upsample': 0, 'landmark_model': 'small', 'jitters': 1, 'tolerance': 0.6},
+    'balanced': {'resize': 0.25, 'upsample': 1, 'landmark_model': 'small', 'jitters': 1, 'tolerance': 0.6},
+    'accurate': {'resize': 0.5, 'upsample': 2, 'landmark_model': 'large', 'jitters': 3, 'tolerance': 0.5},
+}
+DEFAULT_PROFILE = 'balanced'
+
+profile_name = DEFAULT_PROFILE
+profile = RECOGNITION_PROFILES[DEFAULT_PROFILE]
+
+# Warm-up (see warm_up) on a synthetic frame of this size, timed runs after the first:
+WARM_UP_FRAME_SIZE = (480, 640)
+WARM_UP_RUNS = 3
+warm_latency = None     # seconds per frame once warm, reported to the server as 'Ready'
+
+# Optional face tracking across consecutive frames (see start_session):
+TRACK_IOU_THRESHOLD = 0.5       # min overlap to carry an identity forward
+TRACK_CONFIDENCE_DECAY = 0.8    # confidence multiplier for every carried frame
+TRACK_MIN_CONFIDENCE = 0.5      # re-encode the face once confidence drops below this
+
+tracking = {
+    'enabled': False,
+    # each track: {'box': (top, right, bottom, left), 'reg_no': str | None, 'confidence': float}
+    'tracks': [],
+    'encodings_done': 0,
+    'encodings_avoided': 0,
+}
+
 
 # ================================================================================
 # Timer class to calculate time taken by any of the threads/processes etc.:
@@ -79,6 +124,20 @@ class Timer:
         return _help
 
 
+class StageTimer:
+    """Monotonic (perf_counter_ns) timer for the stages of one task.
+    Call `lap(stage)` at the end of every stage, time since the previous lap is added to it."""
+
+    def __init__(self):
+        self.stages = {}
+        self.last_lap = time.perf_counter_ns()
+
+    def lap(self, stage: str):
+        now = time.perf_counter_ns()
+        self.stages[stage] = self.stages.get(stage, 0) + (now - self.last_lap)
+        self.last_lap = now
+
+
 # ================================================================================
 # load the `class` json created from face modelling code (like a student register)
 # ================================================================================
@@ -122,108 +181,237 @@ def load_known_faces():
 # Actual code which checks the attendance, given a frame/image:
 # ================================================================================
 
-def check_attendance(frame: str) -> list:
+def set_profile(name: str) -> str:
+    """Selects the recognition profile, falls back to the default one if unknown."""
+    global profile_name, profile
+    if name not in RECOGNITION_PROFILES:
+        print(f"Unknown recognition profile `{name}`, using `{DEFAULT_PROFILE}`.")
+        name = DEFAULT_PROFILE
+
+    profile_name = name
+    profile = RECOGNITION_PROFILES[name]
+    return profile_name
+
+
+def match_face(face_encoding) -> str | None:
+    """Returns the reg_no of best matching known face, or None if no match."""
+
+    # get a list of true/false for match-found with all the known encodings:
+    matches = face_recognition.compare_faces(
+        known_face_encodings=known_face_encodings,
+        face_encoding_to_check=face_encoding,
+        tolerance=profile['tolerance']
+    )
+
+    # this returns list of distances with all the known encodings
+    face_distance = face_recognition.face_distance(
+        face_encodings=known_face_encodings,
+        face_to_compare=face_encoding
+    )
+
+    # find the person with minimum dist (best match):
+    best_match_index = np.argmin(face_distance)
+    # later this will be also cross checked with matches list [True/False]
+    # Then declared as present or not finally
+
+    # if that minimum dist image exists in matches as True, then mark present:
+    if matches[best_match_index] == True:
+        return known_face_reg_no[best_match_index]
+    return None
+
+
+def check_attendance(frame: str, stage_timer: StageTimer = None) -> list:
     """
     Function which takes just one image_path and returns the reg_no of present people
 
     Args:
         frame (str | list): path of the file
+        stage_timer (StageTimer, optional): records time of each stage (decode, resize, detection...)
 
     Returns:
         list: list with reg no of present people
     """
+    if stage_timer is None:
+        stage_timer = StageTimer()
 
     video_capture = cv2.VideoCapture(frame)
     # video_capture = cv2.imread(frame)
 
     # Frame pre-processing:
     _, frame = video_capture.read()
-    small_frame = cv2.resize(frame, (0, 0), fx=0.25, fy=0.25)
+    stage_timer.lap('decode')
+
+    small_frame = cv2.resize(
+        frame, (0, 0), fx=profile['resize'], fy=profile['resize'])
     rgb_small_frame = np.ascontiguousarray(small_frame[:, :, ::-1])
+    stage_timer.lap('resize')
 
     # get the locations where faces are recognized:
-    face_locations = face_recognition.face_locations(rgb_small_frame)
+    face_locations = face_recognition.face_locations(
+        rgb_small_frame, number_of_times_to_upsample=profile['upsample'])
+    stage_timer.lap('detection')
+
+    # identities carried forward by the tracker (None = needs encoding):
+    if tracking['enabled']:
+        identities, track_confidences = associate_tracks(face_locations)
+        stage_timer.lap('tracking')
+    else:
+        identities = [None] * len(face_locations)
+        track_confidences = [None] * len(face_locations)
+
+    to_encode = [i for i, conf in enumerate(track_confidences) if conf is None]
 
     # get the encodings of those recognized faces:
     face_encodings = face_recognition.face_encodings(
         face_image=rgb_small_frame,
-        known_face_locations=face_locations,
-        num_jitters=1
+        known_face_locations=[face_locations[i] for i in to_encode],
+        num_jitters=profile['jitters'],
+        model=profile['landmark_model']
     )
+    stage_timer.lap('encoding')
 
     # ------------------------------------------------------------------------
-    present_people = []
-
-    # for all the faces found in this image/frame:
-    for face_encoding in face_encodings:
+    # for all the (newly) encoded faces found in this image/frame:
+    for i, face_encoding in zip(to_encode, face_encodings):
+        identities[i] = match_face(face_encoding)
+    stage_timer.lap('matching')
 
-        # get a list of true/false for match-found with all the known encodings:
-        matches = face_recognition.compare_faces(
-            known_face_encodings=known_face_encodings,
-            face_encoding_to_check=face_encoding
-        )
+    if tracking['enabled']:
+        update_tracks(face_locations, identities, track_confidences)
+        tracking['encodings_done'] += len(to_encode)
+        tracking['encodings_avoided'] += len(face_locations) - len(to_encode)
 
-        # this returns list of distances with all the known encodings
-        face_distance = face_recognition.face_distance(
-            face_encodings=known_face_encodings,
-            face_to_compare=face_encoding
-        )
-
-        # find the person with minimum dist (best match):
-        best_match_index = np.argmin(face_distance)
-        # later this will be also cross checked with matches list [True/False]
-        # Then declared as present or not finally
-
-        # if that minimum dist image exists in matches as True, then mark present:
-        if matches[best_match_index] == True:
-            reg_no = known_face_reg_no[best_match_index]
-            present_people.append(reg_no)
+    present_people = [reg_no for reg_no in identities if reg_no is not None]
 
     video_capture.release()
     cv2.destroyAllWindows()
+    stage_timer.lap('cleanup')
     return present_people
 
 
+# ================================================================================
+# Face tracking across consecutive frames (skips re-encoding known faces):
+# ================================================================================
+
+def get_iou(box_1: tuple, box_2: tuple) -> float:
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(box_1[0], box_2[0]), min(box_1[2], box_2[2])
+    left, right = max(box_1[3], box_2[3]), min(box_1[1], box_2[1])
+
+    intersection = max(0, bottom - top) * max(0, right - left)
+    area_1 = (box_1[2] - box_1[0]) * (box_1[1] - box_1[3])
+    area_2 = (box_2[2] - box_2[0]) * (box_2[1] - box_2[3])
+    union = area_1 + area_2 - intersection
+
+    return intersection / union if union > 0 else 0.0
+
+
+def associate_tracks(face_locations: list) -> tuple:
+    """
+    Greedily matches the detected faces with the tracks of previous frame (by IoU).
+
+    Returns:
+        tuple: (identities, confidences) per face.
+        Confidence is None for faces which need to be encoded again
+        (new face, or track confidence decayed below TRACK_MIN_CONFIDENCE).
+    """
+    identities = [None] * len(face_locations)
+    confidences = [None] * len(face_locations)
+
+    pairs = []
+    for i, box in enumerate(face_locations):
+        for j, track in enumerate(tracking['tracks']):
+            iou = get_iou(box, track['box'])
+            if iou >= TRACK_IOU_THRESHOLD:
+                pairs.append((iou, i, j))
+
+    used_faces, used_tracks = set(), set()
+    for iou, i, j in sorted(pairs, reverse=True):
+        if i in used_faces or j in used_tracks:
+            continue
+        used_faces.add(i)
+        used_tracks.add(j)
+
+        track = tracking['tracks'][j]
+        confidence = track['confidence'] * TRACK_CONFIDENCE_DECAY
+        if confidence >= TRACK_MIN_CONFIDENCE:
+            identities[i] = track['reg_no']
+            confidences[i] = confidence
+
+    return identities, confidences
+
+
+def update_tracks(face_locations: list, identities: list, confidences: list):
+    """Replaces the tracks with the faces of current frame.
+    Freshly encoded faces start again with full confidence."""
+    tracking['tracks'] = [
+        {
+            'box': tuple(box),
+            'reg_no': reg_no,
+            'confidence': 1.0 if confidence is None else confidence
+        } for box, reg_no, confidence in zip(face_locations, identities, confidences)
+    ]
+
+
+def start_session(enable_tracking: bool = False):
+    """Reset the tracker for a new session of (consecutive) frames."""
+    tracking['enabled'] = enable_tracking
+    tracking['tracks'] = []
+    tracking['encodings_done'] = 0
+    tracking['encodings_avoided'] = 0
+
+
+def end_session() -> dict:
+    """Returns the encoding stats of the session and disables the tracker."""
+    stats = {
+        'tracking': tracking['enabled'],
+        'encodings_done': tracking['encodings_done'],
+        'encodings_avoided': tracking['encodings_avoided'],
+    }
+    start_session(enable_tracking=False)
+    return stats
+
+
 # ================================================================================
 # Logging helper functions to save logs:
 # ================================================================================
 
 def create_log(log: dict):
-    """Creates a log and appends it to the file"""
-    # Create a new file if it doesn't exist:
-    if not os.path.exists(attendance_log_file):
-        with open(attendance_log_file, 'w') as file:
-            json.dump([], file)
+    """Appends the log to the (json-lines) file via the buffered writer"""
+    global log_writer
+    if log_writer is None:
+        log_writer = JsonLinesWriter(attendance_log_file)
+    log_writer.write(log)
 
-    # Load the existing data:
-    with open(attendance_log_file, 'r') as file:
-        data = json.load(file)
 
-    # Append the new log:
-    data.append(log)
-    with open(attendance_log_file, 'w') as file:
-        json.dump(data, file, indent=4)
+def load_logs() -> list:
+    """Returns all the logs saved so far as a list (flushes pending ones first)"""
+    if log_writer is not None:
+        log_writer.flush()
+    return read_json_lines(attendance_log_file)
 
 
 # ================================================================================
 # Main function which will be called from the other file:
 # ================================================================================
 
-def check_image(image_data: str, timestamp: str) -> dict:
+def check_image(image_data: str, frame_key: int) -> dict:
     """
     Processes a single image for attendance checking.
 
     Args:
         image_data: The image (path) to be checked.
-        timestamp: The timestamp associated with the image.
+        frame_key: The frame key (epoch ms + frame ordinal) associated with the image.
 
     Returns:
-        dict: Log data including timestamp, processing times, and list of people present.
+        dict: Log data including frame key, processing times, and list of people present.
     """
-    # Timer for attendance checking
+    # Timer for attendance checking (and per stage timings in nanoseconds)
     timer = Timer()
+    stage_timer = StageTimer()
+    encodings_before = tracking['encodings_done'], tracking['encodings_avoided']
     timer.start()
-    present = check_attendance(image_data)
+    present = check_attendance(image_data, stage_timer)
     timer.end()
 
     # Get time records for image processing:
@@ -232,20 +420,94 @@ def check_image(image_data: str, timestamp: str) -> dict:
         end_name="task_end_time",
         diff_name="task_time_taken"
     )
+    time_records["stages_ns"] = dict(stage_timer.stages)
 
     response = {
-        "timestamp": timestamp,
+        "frame_key": frame_key,
         "time_records": time_records,
         "people_present": present,
     }
 
+    # Faces of this frame encoded / carried by the tracker (aggregated by the server):
+    if tracking['enabled']:
+        response["face_tracking"] = {
+            "faces_encoded": tracking['encodings_done'] - encodings_before[0],
+            "encodings_avoided": tracking['encodings_avoided'] - encodings_before[1],
+        }
+
     create_log(response)
+    # Logging time is only known after the log is queued, so it is not in the saved log
+    # (which keeps its own copy of the stages):
+    stage_timer.lap('logging')
+    time_records["stages_ns"] = dict(stage_timer.stages)
     return response
 
 
+def load_libraries() -> dict:
+    """Imports cv2 and face_recognition once, returns the seconds taken by each import."""
+    global cv2, face_recognition
+    timings = {}
+    with libraries_lock:
+        if cv2 is None:
+            start = time.perf_counter()
+            cv2 = importlib.import_module('cv2')
+            timings['import cv2'] = time.perf_counter() - start
+        if face_recognition is None:
+            start = time.perf_counter()
+            face_recognition = importlib.import_module('face_recognition')
+            timings['import face_recognition'] = time.perf_counter() - start
+    return timings
+
+
+def warm_up() -> float:
+    """
+    Runs the recognition pipeline on a synthetic frame, so the one-off costs of the
+    first frame (dlib / OpenCV initialisation, first touch of the known encodings)
+    are paid before any task arrives.
+
+    Returns:
+        float: Warm per-frame latency (seconds), the median of the timed runs.
+    """
+    global warm_latency
+    frame_path = os.path.join(JSON_FOLDER, 'warm_up.jpg')
+    frame = np.random.default_rng(0).integers(
+        0, 256, (*WARM_UP_FRAME_SIZE, 3), dtype=np.uint8)
+    cv2.imwrite(frame_path, frame)
+
+    # Noise has no faces, so the encoder and the matcher also get one fixed box:
+    height, width = WARM_UP_FRAME_SIZE
+    box = (height // 4, width * 3 // 4, height * 3 // 4, width // 4)
+    rgb_frame = np.ascontiguousarray(frame[:, :, ::-1])
+
+    timings = []
+    try:
+        for _ in range(WARM_UP_RUNS + 1):
+            start = time.perf_counter()
+            check_attendance(frame_path)
+            encodings = face_recognition.face_encodings(
+                face_image=rgb_frame, known_face_locations=[box],
+                num_jitters=profile['jitters'], model=profile['landmark_model'])
+            if known_face_encodings:
+                match_face(encodings[0])
+            timings.append(time.perf_counter() - start)
+    finally:
+        os.remove(frame_path)
+
+    # The first (cold) run is only the warm-up:
+    warm = sorted(timings[1:])
+    warm_latency = warm[len(warm) // 2]
+    print(f"Warm-up done, cold frame {timings[0]:.3f} secs, warm frame {warm_latency:.3f} secs.")
+    return warm_latency
+
+
 def init():
+    global log_writer
+    load_libraries()
     load_register()
     load_known_faces()
+    if log_writer is None:
+        log_writer = JsonLinesWriter(attendance_log_file)
+    warm_up()
 
 
 # ================================================================================
@@ -256,7 +518,7 @@ if __name__ == "__main__":
     DEBUG = True
     init()
     image_path = 'temp_test.jpg'
-    timestamp = '9/1/2025, 11:06:12 pm, 0'
-    print(f"\nChecking attendance for image: `{image_path}` @ [{timestamp}]")
-    response = check_image(image_path, timestamp)
+    frame_key = 1736463972000   # 9/1/2025, 11:06:12 pm, 0
+    print(f"\nChecking attendance for image: `{image_path}` @ [{frame_key}]")
+    response = check_image(image_path, frame_key)
     print(json.dumps(response, indent=4))
@@ -0,0 +1,86 @@
+# Benchmark of the recognition profiles (fast / balanced / accurate):
+# Runs every profile over a folder of sample frames and reports
+#   - frames per second
+#   - match agreement with the reference profile (default: `accurate`)
+#
+# Needs the same setup as a client (Jsons/class.json and Models/*.pkl).
+# Usage:
+#   python benchmark_profiles.py <sample_images_folder> [reference_profile]
+
+import os
+import sys
+import time
+import attendance
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+def run_profile(name: str, images: list) -> tuple:
+    """Returns (frames/sec, list of present sets) for the given profile."""
+    attendance.set_profile(name)
+    attendance.start_session(enable_tracking=False)
+
+    results = []
+    start = time.perf_counter()
+    for image in images:
+        results.append(set(attendance.check_attendance(image)))
+    time_taken = time.perf_counter() - start
+
+    fps = len(images) / time_taken if time_taken > 0 else 0.0
+    return fps, results
+
+
+def get_agreement(results: list, reference: list) -> tuple:
+    """Returns (exact match %, mean jaccard %) of the present sets vs reference."""
+    exact = 0
+    jaccard = 0.0
+    for found, expected in zip(results, reference):
+        exact += found == expected
+        union = found | expected
+        jaccard += len(found & expected) / len(union) if union else 1.0
+
+    count = max(len(reference), 1)
+    return round(exact / count * 100, 2), round(jaccard / count * 100, 2)
+
+
+def main(folder: str, reference_profile: str = 'accurate'):
+    images = sorted(
+        os.path.join(folder, file) for file in os.listdir(folder)
+        if file.lower().endswith(IMAGE_EXTENSIONS))
+
+    if not images:
+        print(f"No images found in `{folder}`.")
+        return
+
+    if reference_profile not in attendance.RECOGNITION_PROFILES:
+        print(f"Unknown reference profile `{reference_profile}`.")
+        return
+
+    attendance.init()
+    print(f"Benchmarking {len(attendance.RECOGNITION_PROFILES)} profiles on {len(images)} images...")
+
+    # Warm up once, so the first profile does not pay the model loading cost:
+    attendance.check_attendance(images[0])
+
+    stats = {}
+    for name in attendance.RECOGNITION_PROFILES:
+        stats[name] = run_profile(name, images)
+
+    reference = stats[reference_profile][1]
+
+    print(f'\n    | {"Profile".center(10)} | {"Frames/sec".center(10)} | {"Exact %".center(10)} | {"Jaccard %".center(10)} |')
+    for name, (fps, results) in stats.items():
+        exact, jaccard = get_agreement(results, reference)
+        print(f'    | {name.center(10)} | {str(round(fps, 2)).center(10)} | {str(exact).center(10)} | {str(jaccard).center(10)} |')
+    print(f'\n    (agreement is measured against the `{reference_profile}` profile)')
+
+    attendance.set_profile(attendance.DEFAULT_PROFILE)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python benchmark_profiles.py <sample_images_folder> [reference_profile]")
+        exit(1)
+
+    main(*sys.argv[1:3])
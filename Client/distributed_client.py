@@ -13,7 +13,8 @@ import random
 import socket
 import threading
 import attendance
-from datetime import datetime
+from datetime import datetime, timezone
+from log_writer import JsonLinesWriter
 from networking import receive_message, send_message, handle_send, handle_recv
 
 # ------------------------------------------------------------------------------
@@ -25,15 +26,16 @@ SERVER_IP = "localhost"
 SERVER_PORT = 12345
 DEVICE_NAME = socket.gethostname()
 TIMEOUT = None    # set to 'None' or any 'int' (seconds)
+TRACKING = True   # track faces across consecutive frames (static mode only)
 
 MODELS_FOLDER = './Models/'
 IMAGES_FOLDER = './Images/'
 JSONS_FOLDER = './Jsons/'
 
 MY_CLIENT_ID = None
-LOGS = []
 
-file_save_lock = threading.Lock()
+# Append-only writer for the client logs (created on first use):
+log_writer = None
 
 # ------------------------------------------------------------------------------
 # Utility functions:
@@ -51,17 +53,44 @@ def prepare_folder(folder_path: str):
 
 
 def append_log(log: dict):
-    LOGS.append(log)
-
-    with file_save_lock:
-        with open(os.path.join(JSONS_FOLDER, f'logs.json'), 'w') as f:
-            json.dump(LOGS, f, indent=4)
+    global log_writer
+    if log_writer is None:
+        log_writer = JsonLinesWriter(os.path.join(JSONS_FOLDER, 'logs.jsonl'))
+    log_writer.write(log)
 
 
 def get_timestamp():
     return datetime.now().strftime('%Y-%m-%d_%I-%M-%S_%p')
 
 
+def split_frame_key(frame_key: int) -> tuple:
+    """Display parts (date, time, frame ordinal) of the frame key (epoch ms + frame ordinal)"""
+    dt = datetime.fromtimestamp(frame_key // 1000, tz=timezone.utc)
+    return dt.strftime('%d/%m/%Y'), dt.strftime('%I:%M:%S %p'), frame_key % 1000
+
+
+def add_trace(result: dict, trace_id: str, received_ns: int, start_ns: int, end_ns: int):
+    """Adds the spans (wall clock ns) of this frame to the result, if the server traces it."""
+    if trace_id is None:
+        return
+
+    spans = [{'name': 'check image', 'lane': 'processing', 'start_ns': start_ns, 'end_ns': end_ns}]
+
+    # Stages run one after the other from the start of the processing:
+    stage_start = start_ns
+    for stage, duration in result.get("time_records", {}).get("stages_ns", {}).items():
+        spans.append({'name': stage, 'lane': 'stages',
+                      'start_ns': stage_start, 'end_ns': stage_start + duration})
+        stage_start += duration
+
+    result["trace"] = {
+        'trace_id': trace_id,
+        'received_ns': received_ns,
+        'sent_ns': time.time_ns(),
+        'spans': spans,
+    }
+
+
 def print_header(
         note: str = '', box_style: bool = True,
         header_line: bool = False, footer_line: bool = False,
@@ -264,15 +293,18 @@ def static_load_balancing(client_socket):
             resp = handle_recv(
                 *receive_message(client_socket, save_folder=IMAGES_FOLDER),
                 expected_topic='Static Image')
+            received_ns = time.time_ns()
 
-            image_timestamp = resp["message"]
+            frame_key = int(resp["message"])
             image_name = resp["data"]["filename"]
-            i_date, i_time, i_cnt = image_timestamp.split(',')
+            i_date, i_time, i_cnt = split_frame_key(frame_key)
             print(
-                f"Received image \t : 📂 '{image_name}' [📅 {i_date} 🕑{i_time} 🆔{i_cnt}]")
+                f"Received image \t : 📂 '{image_name}' [📅 {i_date} 🕑 {i_time} 🆔 {i_cnt}]")
 
             # Process the image:
-            status, result = process_image(image_name, image_timestamp)
+            start_ns = time.time_ns()
+            status, result = process_image(image_name, frame_key)
+            end_ns = time.time_ns()
 
             if status == False:
                 if result == "Keyboard_Interrupt":
@@ -282,7 +314,8 @@ def static_load_balancing(client_socket):
 
             images_processed_count += 1
 
-            # Send the result back to the server:
+            # Send the result back to the server (with the spans of this frame):
+            add_trace(result, resp.get("trace"), received_ns, start_ns, end_ns)
             handle_send(*send_message(client_socket,
                         topic="Processed Data", message=json.dumps(result)))
 
@@ -306,19 +339,22 @@ def dynamic_load_balancing(client_socket):
             resp = handle_recv(
                 *receive_message(client_socket, save_folder=IMAGES_FOLDER),
                 expected_topic='Dynamic Task')
+            received_ns = time.time_ns()
 
             # If 'message' is = 'done', it means all the images are processed:
             if resp["message"].lower() == "done":
                 break
 
-            image_timestamp = resp["message"]
+            frame_key = int(resp["message"])
             image_name = resp["data"]["filename"]
-            i_date, i_time, i_cnt = image_timestamp.split(',')
+            i_date, i_time, i_cnt = split_frame_key(frame_key)
             print(
-                f"Received image \t : 📂 '{image_name}' [📅 {i_date} 🕑{i_time} 🆔{i_cnt}]")
+                f"Received image \t : 📂 '{image_name}' [📅 {i_date} 🕑 {i_time} 🆔 {i_cnt}]")
 
             # Process the image:
-            status, result = process_image(image_name, image_timestamp)
+            start_ns = time.time_ns()
+            status, result = process_image(image_name, frame_key)
+            end_ns = time.time_ns()
 
             if status == False:
                 if result == "Keyboard_Interrupt":
@@ -328,7 +364,8 @@ def dynamic_load_balancing(client_socket):
 
             images_processed_count += 1
 
-            # Send the result back to the server:
+            # Send the result back to the server (with the spans of this frame):
+            add_trace(result, resp.get("trace"), received_ns, start_ns, end_ns)
             handle_send(*send_message(client_socket,
                         topic="Processed Data", message=json.dumps(result)))
 
@@ -346,7 +383,7 @@ def dynamic_load_balancing(client_socket):
 # ------------------------------------------------------------------------------
 
 
-def process_image(image_name, timestamp, min_time=0, max_time=5):
+def process_image(image_name, frame_key, min_time=0, max_time=5):
     """
     Process the image and return the JSON response.
 
@@ -360,7 +397,7 @@ def process_image(image_name, timestamp, min_time=0, max_time=5):
 
     Args:
         image_name (str): The name of the image.
-        timestamp (str): The timestamp of the image.
+        frame_key (int): The frame key (epoch ms + frame ordinal) of the image.
         min_time (int, optional): Minimum time to take for processing the image.
         max_time (int, optional): Maximum time to take for processing the image.
 
@@ -386,9 +423,9 @@ def process_image(image_name, timestamp, min_time=0, max_time=5):
     # Process the image:
     try:
         if dummy_mode:
-            resp = dummy_process_image(image_path, timestamp)
+            resp = dummy_process_image(image_path, frame_key)
         else:
-            resp = attendance.check_image(image_path, timestamp)
+            resp = attendance.check_image(image_path, frame_key)
 
         # --------------------------------------------------------------------
         # Common part in both modes : If min_time is set, ensure that
@@ -423,7 +460,7 @@ def process_image(image_name, timestamp, min_time=0, max_time=5):
     return status, resp
 
 
-def dummy_process_image(image_name, timestamp):
+def dummy_process_image(image_name, frame_key):
     """Mock function to process an image and return JSON."""
     people = ["no one", "someone", "everyone"]
     present = []
@@ -435,11 +472,12 @@ def dummy_process_image(image_name, timestamp):
             present.append(c)
 
     return {
-        "timestamp": timestamp,
+        "frame_key": frame_key,
         "time_records": {
             "task_start_time": "01/01/2000, 00:00:00 AM",
             "task_end_time": "12/12/2012, 12:12:12 PM",
             "task_time_taken": 0,
+            "stages_ns": {},
             "note": "This is a dummy response."
         },
         "people_present": present
@@ -450,7 +488,22 @@ def dummy_process_image(image_name, timestamp):
 # ------------------------------------------------------------------------------
 
 
+def print_startup_report(steps: dict, total: float):
+    print(f"Startup took {total:.3f} secs:")
+    for name, seconds in steps.items():
+        print(f"\t{name.ljust(28)} : {seconds:.3f} secs")
+
+
 def main():
+    started = time.perf_counter()
+    startup_steps = {}
+
+    # The heavy imports (cv2, face_recognition) run while connecting to the server:
+    def load_libraries():
+        startup_steps.update(attendance.load_libraries())
+    libraries_thread = threading.Thread(target=load_libraries, daemon=True)
+    libraries_thread.start()
+
     # First prepare the necessary folders:
     prepare_folder(MODELS_FOLDER)
     prepare_folder(IMAGES_FOLDER)
@@ -465,7 +518,9 @@ def main():
     # Connect to the server and complete initial setup phase:
     print_header(note='Connection Initialization Phase with server')
 
+    start = time.perf_counter()
     resp = connect_to_server(client_socket=client_socket)
+    startup_steps['connect + models'] = time.perf_counter() - start
     if resp == True:
         print_header(
             footer_line=True, box_style=False,
@@ -473,8 +528,23 @@ def main():
     else:
         raise Exception(resp)
 
-    # Initialize the attendance module:
+    # Initialize the attendance module (waits for the imports if still running):
+    start = time.perf_counter()
+    libraries_thread.join()
+    startup_steps['wait for imports'] = time.perf_counter() - start
+    start = time.perf_counter()
     attendance.init()
+    startup_steps['init attendance + warm-up'] = time.perf_counter() - start
+    print_startup_report(startup_steps, time.perf_counter() - started)
+
+    # S2 - Tell the server this client is warm (no task is sent before this),
+    # with the recognition profiles it knows:
+    ready = {
+        'warm_latency': round(attendance.warm_latency, 4),
+        'profiles': list(attendance.RECOGNITION_PROFILES),
+    }
+    handle_send(*send_message(client_socket, topic='Ready', message=json.dumps(ready)))
+    print(f"Sent ready, warm frame latency \t : {attendance.warm_latency:.3f} secs")
 
     # Keep looping the load balancing phase:
     # Prev part was once to be done, this part is to be done repeatedly.
@@ -505,10 +575,20 @@ def main():
                                expected_topic='Load Balancing')
             load_balancing = resp["message"]
 
+            # Get the recognition profile for this session:
+            resp = handle_recv(*receive_message(client_socket),
+                               expected_topic='Recognition Profile')
+            profile = attendance.set_profile(resp["message"])
+
             # Stop the scrolling text once server sends next batch of task:
             stop_scroll.set()
             scroll_thread.join()
             print(f"`{load_balancing}` Load balancing mode selected.")
+            print(f"`{profile}` Recognition profile selected.")
+
+            # Static mode gets consecutive frames, so faces can be tracked:
+            attendance.start_session(
+                enable_tracking=TRACKING and load_balancing.lower() == "static")
 
             # Load balancing phase:
             if load_balancing.lower() == "static":
@@ -516,6 +596,11 @@ def main():
             else:
                 status, resp = dynamic_load_balancing(client_socket)
 
+            session_stats = attendance.end_session()
+            if session_stats['tracking']:
+                print(f"Face tracking: {session_stats['encodings_avoided']} encodings avoided, "
+                      f"{session_stats['encodings_done']} faces encoded.")
+
             if status == True:
                 print("All images processed successfully.")
                 print_header(note='Load Balancing phase successful.',
@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import queue
+import atexit
+import threading
+from typing import Literal
+from batch_writer import collect_batches
+
+
+# ================================================================================
+# Append-only JSON-lines writer (used for the client side result logs):
+# ================================================================================
+
+
+class JsonLinesWriter:
+    """
+    Buffered, append-only JSON-lines writer with a background flush thread.
+
+    Every `write()` only serializes the record and puts it in an in-memory
+    queue, so the caller (recognition hot path) never touches the disk.
+    The background thread appends the queued lines to the file whenever
+    `flush_at` records are waiting or `flush_interval` seconds have passed
+    (see batch_writer.collect_batches, copied from the root directory).
+
+    Args:
+        file_path (str): Path of the `.jsonl` file (opened in append mode).
+        max_buffer (int): Max records held in memory, `write()` blocks when full.
+        flush_at (int): Buffer size that triggers an early flush.
+        flush_interval (float): Max seconds a record waits in the buffer.
+        fsync_policy (str): 'always' (after every flush), 'interval'
+            (at most once per `fsync_interval` seconds) or 'never'.
+        fsync_interval (float): Seconds between fsyncs for 'interval' policy.
+    """
+
+    def __init__(self, file_path: str, max_buffer: int = 1024,
+                 flush_at: int = 64, flush_interval: float = 1.0,
+                 fsync_policy: Literal['always', 'interval', 'never'] = 'interval',
+                 fsync_interval: float = 5.0):
+
+        if fsync_policy not in ('always', 'interval', 'never'):
+            raise ValueError(f"Invalid fsync policy: {fsync_policy}")
+
+        self.file_path = file_path
+        self.max_buffer = max_buffer
+        self.flush_at = min(flush_at, max_buffer)
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+
+        folder = os.path.dirname(file_path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._file = open(file_path, 'a', encoding='utf-8')
+        self._last_fsync = time.monotonic()
+
+        # Bounded, so write() blocks when the flush thread falls behind:
+        self._queue = queue.Queue(maxsize=max_buffer)
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._error = None       # last failed batch write, raised by flush()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record: dict):
+        """Queue one record, blocks only if the buffer is full."""
+        if self._closed:
+            raise ValueError(f"Writer for `{self.file_path}` is closed.")
+        self._queue.put(json.dumps(record))
+
+    def flush(self):
+        """Block until everything written so far is on the file.
+        Raises the error of a batch which could not be written (its records are lost)."""
+        # After close() everything is already on the file (nothing would answer):
+        if not self._closed:
+            done = threading.Event()
+            self._queue.put(done)
+            # The thread may stop (close() from another thread) before it gets to this one:
+            while not done.wait(0.1) and self._thread.is_alive():
+                pass
+
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def close(self):
+        """Flush the remaining records, stop the thread and close the file."""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def _run(self):
+        for batch, flushes in collect_batches(self._queue, self.flush_at, self.flush_interval):
+            # A failed write (disk full, closed file) must not kill the thread,
+            # else every flush() and writer waiting for space would hang:
+            if batch:
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    self._error = e
+
+            for done in flushes:
+                done.set()
+
+    def _write_batch(self, batch: list):
+        self._file.write('\n'.join(batch) + '\n')
+        self._file.flush()
+
+        now = time.monotonic()
+        if self.fsync_policy == 'always' or (
+                self.fsync_policy == 'interval' and
+                now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+
+def read_json_lines(file_path: str) -> list:
+    """Read a `.jsonl` file back as a list (same shape as the old json logs).
+    A partially written last line (crash mid-write) is ignored."""
+    records = []
+    if not os.path.exists(file_path):
+        return records
+
+    with open(file_path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
@@ -1,15 +1,29 @@
+import startup
 import os
 import time
 import json
-import pandas as pd
-from datetime import datetime
+import glob
+import sqlite3
+import tempfile
+import functools
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
+from werkzeug.wsgi import get_input_stream
 from werkzeug.exceptions import RequestEntityTooLarge
-from flask import (Flask, render_template, request,
+from flask import (Flask, render_template, request, Response, stream_with_context,
                    send_file, send_from_directory, jsonify)
+startup.mark('import flask')
 
-import distributed_server
-from image_processor import process_image
+import tracing
+import coordinator
+import session_store
+import attendance_archive
+from image_processor import (process_image, save_frames, read_frame_stream, extract_frames,
+                             get_video_duration, format_frame_key, get_key_datetime)
+startup.mark('import project modules')
+
+# pandas (+ openpyxl) is only needed by /download, it is loaded there on first use.
 
 # To cut
 # from attendance import save_register
@@ -28,23 +42,34 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * MB
 load_dotenv()
 DEBUG = os.environ.get('debug_mode') == "True"
 
-# Just initializing the variable, will be updated in the upload_video route
-no_of_frames_recvd = 100
-processing_mode = 'Static'
-js_timestamps, py_timestamps, js_mod_timestamps, file_names = [], [], [], []
+# Nothing is kept between requests: upload settings are per request (see get_upload_settings),
+# sessions are in the session store and everything else is in the coordinator process,
+# so any number of worker processes can serve the routes (ex. `gunicorn -w 4 app:app`).
+# Only the compiled registers are cached (see get_cached_register), every request checks
+# the cached copy against the register version in the session store.
+REGISTER_CACHE_SIZE = int(os.environ.get('register_cache_size', 16))
+register_cache = OrderedDict()      # (session id, version) -> {'register', 'timings', 'page'}
+register_cache_lock = threading.Lock()
 
 # Create the required folders if not present
 os.makedirs(os.environ.get('upload_folder'), exist_ok=True)
 os.makedirs(os.environ.get('excel_folder'), exist_ok=True)
 os.makedirs('jsons', exist_ok=True)
+startup.mark('init folders')
 
 
 # ---------------------------------------------------------------------
-# Start the image processing (distributed) server:
-# So that processing clients are connected before the web server starts
+# The image processing (distributed) server runs in the coordinator process:
+#   python coordinator.py  (before the web server, clients connect to it)
 # ---------------------------------------------------------------------
-distributed_server.start_server()
-distributed_server.get_clients()
+
+
+@app.errorhandler(ConnectionError)
+def coordinator_down(e):
+    return jsonify({'status': 'error', 'message': str(e)}), 503
+
+
+startup.report('web')
 
 # ---------------------------------------------------------------------
 # Logger:
@@ -78,157 +103,458 @@ def send_asset(filename):
     return send_from_directory('assets', filename)
 
 
-# Route to upload the video and process the images
+# Route to upload the frames as a binary stream (see image_processor.read_frame_stream)
+# The form fields (frame_count, processing_mode, recognition_profile, priority) come as query params.
+# Each frame is saved as soon as it arrives, so the memory does not grow with the frame count.
+# Pipeline mode (?pipeline=True or `pipeline_upload` in .env, dynamic mode only): every saved
+# frame goes to the clients right away, so recognition runs while the upload is still going on.
+@app.route('/upload_frames', methods=['POST'])
+def upload_frames():
+    t1 = time.time()
+    try:
+        settings = get_upload_settings(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    # Raw body (also chunked), not limited by MAX_CONTENT_LENGTH:
+    stream = get_input_stream(request.environ, max_content_length=None)
+
+    session_id = session_store.new_session_id()
+    on_frame = start_upload(session_id, settings)
+
+    response = None
+    try:
+        saved = save_frames(read_frame_stream(stream), on_frame, folder_name=session_id)
+        response = save_upload(*saved, t1, settings, session_id)
+    except ValueError as e:
+        response = jsonify({'status': 'error', 'message': f'Invalid frame stream: {e}'}), 400
+    finally:
+        finish_upload(session_id, on_frame, failed=response is None or response[1] != 200)
+
+    return response
+
+
+# Route to upload the recorded video itself, the frames are extracted on the server:
+# Query params: frame_count, processing_mode, recognition_profile, pipeline (as /upload_frames)
+# and start (js timestamp of the recording start), duration (ms, recordings have none).
+@app.route('/upload_recording', methods=['POST'])
+def upload_recording():
+    t1 = time.time()
+    try:
+        settings = get_upload_settings(request.args)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    frame_count = settings['frame_count']
+    start_timestamp = request.args.get('start')
+
+    if not frame_count or not start_timestamp:
+        return jsonify({'status': 'error',
+                        'message': 'frame_count and start are required'}), 400
+
+    # Save the video (in chunks, the body is never held in memory):
+    session_id = session_store.new_session_id()
+    video_path = os.path.join(os.environ.get('upload_folder'), f'{session_id}.webm')
+    stream = get_input_stream(request.environ, max_content_length=None)
+    with open(video_path, 'wb') as f:
+        while chunk := stream.read(MB):
+            f.write(chunk)
+
+    # The video is only needed until its frames are extracted:
+    try:
+        duration = request.args.get('duration', type=float) or get_video_duration(video_path)
+        if duration <= 0:
+            return jsonify({'status': 'error', 'message': 'Video duration is not known'}), 400
+
+        on_frame = start_upload(session_id, settings)
+
+        # Extraction (producer thread) -> save (here) -> clients, all at the same time:
+        response = None
+        try:
+            saved = save_frames(
+                extract_frames(video_path, frame_count, start_timestamp, duration), on_frame,
+                folder_name=session_id)
+            response = save_upload(*saved, t1, settings, session_id)
+        except ValueError as e:
+            response = jsonify({'status': 'error', 'message': str(e)}), 400
+        finally:
+            finish_upload(session_id, on_frame, failed=response is None or response[1] != 200)
+    finally:
+        try:
+            os.remove(video_path)
+        except OSError:
+            pass
+
+    return response
+
+
+# Route to upload the video and process the images (frames as base64 data urls in the form)
 @app.route('/upload_video', methods=['POST'])
 def upload_video():
     t1 = time.time()
-    global no_of_frames_recvd, file_names, processing_mode
-    global js_timestamps, py_timestamps, js_mod_timestamps
 
     # extract required data from the form response:
-    frames_data = request.form.get('video_data')
-    timestamps = request.form.get('timestamps')
-    frame_count = request.form.get('frame_count')
-    parallel_mode = request.form.get('processing_mode')
+    frames = json.loads(request.form.get('video_data') or '[]')
+    js_timestamps = json.loads(request.form.get('timestamps') or '[]')
+    try:
+        settings = get_upload_settings(request.form)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    settings['pipeline'] = False
+
+    # Convert the base64 to images (a new trace if no other session is running)
+    session_id = session_store.new_session_id()
+    start_upload(session_id, settings)
+    saved = process_image(js_timestamps, frames, folder_name=session_id)
+    finish_upload(session_id, None)
+    return save_upload(*saved, t1, settings, session_id)
+
+
+def get_upload_settings(params) -> dict:
+    """Settings of one upload (query params or form fields), nothing is shared between uploads.
+    Raises ValueError for an unknown processing mode (checked before anything is saved).
+    Only dynamic uploads are pipelined, static / adaptive need all the frames first."""
+    processing_mode = (params.get('processing_mode') or '').lower()
+    if processing_mode not in session_store.PROCESSING_MODES:
+        raise ValueError(f"Invalid processing mode `{params.get('processing_mode')}`, "
+                         f"use one of {', '.join(session_store.PROCESSING_MODES)}.")
+
+    return {
+        'frame_count': params.get('frame_count', type=int),
+        'processing_mode': processing_mode,
+        'recognition_profile': params.get(
+            'recognition_profile') or os.environ.get('recognition_profile', 'balanced'),
+        'priority': params.get('priority', 1, type=int),
+        'pipeline': processing_mode == 'dynamic' and params.get(
+            'pipeline', os.environ.get('pipeline_upload', 'False')) == 'True',
+    }
+
+
+def start_upload(session_id: str, settings: dict):
+    """Starts the trace and the pipeline (if asked for) in the coordinator.
+    Returns the on_frame callback of save_frames(), None if not a pipeline upload."""
+    coordinator.call('start_upload', session_id, settings)
+
+    if not settings['pipeline']:
+        return None
+    settings['processing_mode'] = 'pipeline'
+    return functools.partial(coordinator.call, 'submit_frame', session_id)
 
-    # convert the string (get/post) response into list
-    frames = eval(frames_data)
-    no_of_frames_recvd = int(frame_count)
-    js_timestamps = eval(timestamps)
-    processing_mode = parallel_mode
 
+def finish_upload(session_id: str, on_frame, failed: bool = False):
+    """Hands the upload's spans (recorded in this worker) to the coordinator's trace,
+    and tells the pipeline that no more frames are coming.
+    A failed upload's pipeline is cancelled first, so no register is saved for it."""
+    coordinator.call('add_spans', tracing.take_spans())
+    if on_frame is not None:
+        if failed:
+            coordinator.call('cancel_session', session_id)
+        coordinator.call('finish_pipeline', session_id)
+
+
+def save_upload(file_names: list, py_timestamps: list, frame_keys: list,
+                duplicates: list, t1: float, settings: dict, session_id: str = None):
+    """Saves the uploaded session (/calc_attendance picks the latest one if not told)."""
     # if no video captured:
-    if not frames:
-        # create_log('Video Upload', 'No video data received', 'Error')
+    if not frame_keys:
         return jsonify({
             'status': 'error',
             'message': 'No video data received'}), 400
 
-    # else:
-        # create_log('Video Upload', 'Video data received', 'Success')
-
-    # Convert the base64 to images
-    file_names, py_timestamps, js_mod_timestamps = process_image(
-        js_timestamps, frames)
-
-    file = os.environ.get('uploaded_data')
-
-    with open(file, 'w') as f:
-        json.dump({
-            'frame_count': no_of_frames_recvd,
-            'processing_mode': processing_mode,
-            'files': file_names,
-            'py': py_timestamps,
-            'js': js_timestamps,
-            'js_mod': js_mod_timestamps,
-        }, f, indent=4)
+    session_id = session_id or session_store.new_session_id()
+    try:
+        session_store.save_session(
+            session_id, settings['frame_count'] or len(frame_keys), settings['processing_mode'],
+            settings['recognition_profile'], file_names, py_timestamps, frame_keys, duplicates)
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'message': f'Could not save the session: {e}'}), 500
 
     t2 = time.time()
 
     return jsonify({'status': 'success',
                     'message': 'Image processing completed!!',
+                    'session_id': session_id,
+                    'frames': len(frame_keys),
                     'time': f'{round(t2-t1, 4)} secs!'}), 200
 
 
 # Route to start attendance calculation on server:
-@app.route('/calc_attendance', methods=['GET'])
+# Only queues the job (latest session if not given), returns the job id right away.
+# Sessions run at the same time share the clients in proportion to their ?priority (1, 2, ...)
+@app.route('/calc_attendance', methods=['GET', 'POST'])
 def calc_attendance():
-    t1 = time.time()
+    # Start load_balancing > compile results (in the background)
+    job = coordinator.call(
+        'submit_job', request.args.get('session_id'), request.args.get('priority', 1, type=int))
+    return jsonify({"status": job['status'], "job_id": job['job_id'],
+                    "session_id": job['session_id']}), 202
 
-    # Call the attendance calculation function
-    # Start load_balancing > compile results > release clients > stop the server
-    distributed_server.driver_function()
 
-    t2 = time.time()
+# Route to get the status (and progress) of an attendance job:
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = coordinator.call('get_job', job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    return jsonify(job), 200
+
+
+# Route to stream the progress of an attendance job (server sent events, every second):
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    if coordinator.call('get_job', job_id) is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+
+    def events():
+        while True:
+            job = coordinator.call('get_job', job_id)
+            yield f"data: {json.dumps(job)}\n\n"
+            if job['finished_at'] is not None:
+                return
+            time.sleep(1)
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-    return jsonify({"status": "completed",
-                    "response": "Attendance calculation successful",
-                    'time': f'{round(t2-t1, 3)} secs'
-                    }), 200
+
+# Route to cancel an attendance job:
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    job = coordinator.call('cancel_job', job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'message': 'Unknown job'}), 404
+    return jsonify(job), 200
+
+
+# Route to get the provisional attendance while the calculation is running:
+# (?session_id=..., the latest started session if not given)
+@app.route('/provisional', methods=['GET'])
+def provisional():
+    return jsonify(coordinator.call('get_provisional', request.args.get('session_id'))), 200
+
+
+# Route to get the progress of all the sessions being processed right now:
+@app.route('/sessions', methods=['GET'])
+def active_sessions():
+    return jsonify([coordinator.call('get_progress', session_id)
+                    for session_id in coordinator.call('get_active_sessions')]), 200
 
 
 # Route to get the final attendance data (result):
+# (?session_id=..., the latest compiled session if not given)
 @app.route('/results', methods=['GET'])
 def results():
-    # Load attendance data from JSON file
-    path = os.environ.get('class_attendance')
-    with open(path, 'r') as file:
-        register = json.load(file)
+    tag = session_store.get_register_version(request.args.get('session_id'))
+    if tag is None:
+        return jsonify({'status': 'error', 'message': 'No attendance compiled yet'}), 404
+
+    # Same version as the browser already has:
+    etag = get_register_etag(*tag)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    session_id, version = tag
+    entry = get_cached_register(session_id, version)
+    if 'page' not in entry:
+        # Pick whatever data you want to display in the results page {{ using reg.item }} from the attendance register
+        entry['page'] = render_template('results.html', register=entry['register'],
+                                        session_id=session_id, timings=entry['timings'])
+
+    response = Response(entry['page'])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response, 200
+
+
+# Route to scrape the live metrics (Prometheus text format):
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(coordinator.call('render_metrics'), mimetype='text/plain; version=0.0.4')
+
+
+# Route to download the per frame trace of the last session (chrome://tracing, Perfetto):
+@app.route('/trace', methods=['GET'])
+def download_trace():
+    if not os.path.exists(tracing.TRACE_FILE):
+        return jsonify({'status': 'error', 'message': 'No trace saved yet'}), 404
+    return send_file(os.path.abspath(tracing.TRACE_FILE), as_attachment=True)
+
+
+# Route to page through the network logs:
+# (/logs?after=<cursor>&topic=<part of topic>&client_id=<id>&limit=100)
+@app.route('/logs', methods=['GET'])
+def get_logs():
+    page, cursor = coordinator.call(
+        'query_logs',
+        after_id=request.args.get('after', 0, type=int),
+        topic=request.args.get('topic'),
+        client_id=request.args.get('client_id', type=int),
+        limit=min(request.args.get('limit', 100, type=int), 1000))
+    return jsonify({'logs': page, 'cursor': cursor}), 200
+
+
+# Route to stream the new network logs (server sent events):
+# The browser's EventSource resumes from the `Last-Event-ID` after a reconnect.
+@app.route('/logs/stream', methods=['GET'])
+def stream_logs():
+    cursor = request.headers.get('Last-Event-ID', type=int)
+    if cursor is None:
+        cursor = request.args.get('after', 0, type=int)
+    topic = request.args.get('topic')
+    client_id = request.args.get('client_id', type=int)
+
+    def events(cursor):
+        while True:
+            page, cursor = coordinator.call('query_logs', cursor, topic, client_id, limit=500)
+            for log in page:
+                yield f"id: {log['id']}\ndata: {json.dumps(log, default=str)}\n\n"
+
+            # Nothing new, wait for the next log (comment line keeps the connection alive):
+            if not page and not coordinator.call('wait_for_logs', cursor, timeout=15):
+                yield ": keep-alive\n\n"
+
+    return Response(stream_with_context(events(cursor)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# Routes to query the attendance history of all the compiled sessions:
+# (/archive/students?below=75 -> students below 75% session attendance)
+@app.route('/archive/students', methods=['GET'])
+def archive_students():
+    below = request.args.get('below', type=float)
+    return jsonify(attendance_archive.get_student_summary(below=below)), 200
+
+
+@app.route('/archive/students/<reg_no>', methods=['GET'])
+def archive_student_history(reg_no):
+    return jsonify(attendance_archive.get_student_history(reg_no)), 200
+
+
+@app.route('/archive/sessions', methods=['GET'])
+def archive_sessions():
+    return jsonify(attendance_archive.get_session_summary()), 200
+
+
+# Save attendance data to Excel, one file per register version (reused on every download):
+# (?session_id=..., the latest compiled session if not given)
+@app.route('/download')
+def download_excel():
+    tag = session_store.get_register_version(request.args.get('session_id'))
+    if tag is None:
+        return jsonify({'status': 'error', 'message': 'No attendance compiled yet'}), 404
+
+    etag = get_register_etag(*tag)
+    if request.if_none_match.contains(etag):
+        return not_modified(etag)
+
+    file_path = get_excel_file(*tag)
+    response = send_file(os.path.abspath(file_path), as_attachment=True, etag=etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# ======================================================================
+# Some helper functions:
+# ======================================================================
+
+
+def get_register_etag(session_id: str, version: int) -> str:
+    return f"{session_id}-v{version}"
+
 
+def not_modified(etag: str) -> Response:
+    response = Response(status=304)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Compiled register of a session version, ready to display (times extracted) with the class timings:
+# Built once per version, a new version (recompiled session) simply gets a new entry.
+def get_cached_register(session_id: str, version: int) -> dict:
+    key = (session_id, version)
+    with register_cache_lock:
+        entry = register_cache.get(key)
+        if entry is not None:
+            register_cache.move_to_end(key)
+            return entry
+
+    register = session_store.get_register(session_id)
     # Update attendance data with extracted time
     for student_id, details in register.items():
         # Extract time for "First_In" and "Last_In" if available
         details['First_In'] = extract_time(details['First_In'])
         details['Last_In'] = extract_time(details['Last_In'])
+    entry = {'register': register, 'timings': get_class_timings(session_id)}
 
-    # Pick whatever data you want to display in the results page {{ using reg.item }} from the attendance register
-    # return render_template('results.html', register=register), 200
-    return render_template('results.html', register=register, timings=get_class_timings()), 200
+    with register_cache_lock:
+        entry = register_cache.setdefault(key, entry)
+        while len(register_cache) > REGISTER_CACHE_SIZE:
+            register_cache.popitem(last=False)
+    return entry
 
 
-# Save attendance data to Excel with timestamped filename:
-@app.route('/download')
-def download_excel():
-    # Load attendance data from JSON file
-    path = os.environ.get('class_attendance')
-    with open(path, 'r') as file:
-        register = json.load(file)
+# Excel file of a register version, written on the first download only:
+# (the files of the older versions of the session are removed)
+def get_excel_file(session_id: str, version: int) -> str:
+    folder = os.environ.get('excel_folder')
+    file_path = os.path.join(folder, f'{session_id}_v{version}.xlsx')
+    if os.path.exists(file_path):
+        return file_path
 
     # Convert the attendance register to a DataFrame
     data = []
-    for reg_no, details in register.items():
+    for reg_no, details in get_cached_register(session_id, version)['register'].items():
         info = {
             'Reg No': reg_no,
             # 'Reg No': details['Reg No'],
             'Name': details['Name'],
-            'In Time': extract_time(details['First_In']),
-            'Out Time': extract_time(details['Last_In']),
+            'In Time': details['First_In'],
+            'Out Time': details['Last_In'],
             'Percentage': details['Percentage'],
             'Status': details['Status']
         }
 
         data.append(info)
 
+    pd = startup.lazy_import('pandas')
     df = pd.DataFrame(data, columns=data[0].keys())
 
-    file_name = f'{datetime.now().strftime("%d-%m-%Y_%H-%M-%S")}.xlsx'
-    file_path = os.path.join(os.environ.get('excel_folder'), file_name)
-
-    df.to_excel(file_path, index=False)
-    return send_file(file_path, as_attachment=True)
-
-
-# ======================================================================
-# Some helper functions:
-# ======================================================================
-
-
-# Function to extract the time by splitting the string
-def extract_time(date_time_string):
+    # Written aside and then renamed, other workers / threads may be downloading the same version:
+    with tempfile.NamedTemporaryFile(dir=folder, prefix=f'{session_id}_v{version}.',
+                                     suffix='.tmp.xlsx', delete=False) as temp:
+        temp_path = temp.name
     try:
-        # If the input is an integer, return "N/A"
-        if isinstance(date_time_string, int):
-            return "N/A"
-
-        # Split by comma and extract the second element (the time)
-        return date_time_string.split(',')[1].strip()
-    except (IndexError, AttributeError):
-        # Catch IndexError (for missing commas) or AttributeError (if input is not a string)
+        df.to_excel(temp_path, index=False)
+        os.replace(temp_path, file_path)
+    except Exception:
+        os.remove(temp_path)
+        raise
+
+    for old_path in glob.glob(os.path.join(folder, f'{session_id}_v*.xlsx')):
+        if old_path != file_path and not old_path.endswith('.tmp.xlsx'):
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+    return file_path
+
+
+# Function to get the display time of a frame key (First_In / Last_In)
+def extract_time(frame_key):
+    # -1 means the student was never seen:
+    if not isinstance(frame_key, int) or frame_key < 0:
         return "N/A"
+    return format_frame_key(frame_key, '%I:%M:%S %p')
 
 
 # Get data like class start_time, end_time and duration in dict
-def get_class_timings():
-    # Get the class started and ended time from the uploaded_data.json
-    with open(os.environ.get('uploaded_data'), 'r') as f:
-        data = json.load(f)
-
-    class_started = data['js'][0]
-    class_ended = data['js'][-1]
-
-    # convert the class_started and class_ended to datetime object
-    start = datetime.strptime(class_started, '%d/%m/%Y, %I:%M:%S %p')
-    end = datetime.strptime(class_ended, '%d/%m/%Y, %I:%M:%S %p')
+def get_class_timings(session_id: str = None):
+    # Get the class started and ended time from the frames of the session (latest compiled one)
+    # frame keys are integers, first / last frame are simply min / max:
+    first_key, last_key = session_store.get_frame_key_range(
+        session_id or session_store.get_latest_register_session_id())
+    start = get_key_datetime(first_key)
+    end = get_key_datetime(last_key)
 
     duration = (end - start).total_seconds()
     duration = {
@@ -297,17 +623,12 @@ def get_class_timings():
 
 
 if __name__ == '__main__':
-    # Run the Flask app:
-    # Make sure use_reloader=False, otherwise the server will start multiple times [and] 
-    # distributed server will also try to start multiple times that will cause an error
-
-    try:
-        app.run(
-            host='0.0.0.0',
-            port=5000,
-            debug=True,
-            use_reloader=False
-        )
-    except Exception as e:
-        distributed_server.release_clients()        
-        distributed_server.stop_server()
\ No newline at end of file
+    # Run the Flask app (development server, start `python coordinator.py` first):
+    # The distributed server is in the coordinator process, so the reloader or several
+    # worker processes (ex. `gunicorn -w 4 app:app`) never start it twice.
+    app.run(
+        host='0.0.0.0',
+        port=5000,
+        debug=True,
+        threaded=True
+    )
@@ -7,6 +7,7 @@
 
 let no_of_frames_to_send = 20;
 let processing_mode = 'Static';
+let recognition_profile = 'balanced';
 
 let mediaRecorder;
 let recordedBlobs;
@@ -16,6 +17,14 @@ let temp;
 let startTimestamp;
 let endTimestamp;
 
+// Extracted frames (jpeg Blobs) and their timestamps, streamed by submitForm():
+let frameBlobs = [];
+let frameTimestamps = [];
+
+// Upload the recorded video itself, the server extracts the frames (no canvas work here):
+const extract_on_server = true;
+let recordedVideo = null;
+
 const video_box = document.querySelector('video');
 const video_placeholder = document.getElementById('placeholder');
 const err_box = document.getElementById('errBox');
@@ -84,7 +93,14 @@ function startRecording() {
 
     mediaRecorder.onstop = (event) => {
         const superBuffer = new Blob(recordedBlobs, { type: 'video/webm' });
-        extractFrames(superBuffer, no_of_frames_to_send);
+        if (extract_on_server) {
+            recordedVideo = superBuffer;
+            document.getElementById('extracting_wait').style.display = 'none';
+            submitButton.disabled = false;
+        }
+        else {
+            extractFrames(superBuffer, no_of_frames_to_send);
+        }
     };
 
     mediaRecorder.ondataavailable = handleDataAvailable;
@@ -195,11 +211,28 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
+    // Set the recognition profile on change:
+    const profileDisplay = document.getElementById('profileDisplay');
+    const profileDropdownItems = document.querySelectorAll('#profileDropdown ul li');
+    const recognitionProfileInput = document.getElementById('recognitionProfile');
+
+    profileDropdownItems.forEach(item => {
+        item.addEventListener('click', () => {
+            const value = item.getAttribute('data-value');
+            profileDisplay.textContent = `Profile: ${value}`;
+            recognitionProfileInput.value = value;
+
+            console.log(`JS: Recognition profile set to: ${value}`);
+        });
+    });
+
     // Set the default values:
     frameDisplay.textContent = `Frames: ${no_of_frames_to_send}`;
     frameCountInput.value = no_of_frames_to_send;
     modeDisplay.textContent = `Mode: ${processing_mode}`;
     processingModeInput.value = processing_mode;
+    profileDisplay.textContent = `Profile: ${recognition_profile}`;
+    recognitionProfileInput.value = recognition_profile;
 });
 
 
@@ -264,9 +297,9 @@ async function extractFrames(videoBlob, no_of_frames_to_send) {
         videoElement.currentTime = desiredTime;
 
         await new Promise(resolve => {
-            videoElement.onseeked = () => {
+            videoElement.onseeked = async () => {
                 context.drawImage(videoElement, 0, 0, canvas.width, canvas.height);
-                frames.push(canvas.toDataURL('image/jpeg'));
+                frames.push(await new Promise(done => canvas.toBlob(done, 'image/jpeg')));
 
                 // Calculate the timestamp for this frame
                 let frameTimestamp = new Date(startTimestamp.getTime() + desiredTime * 1000);
@@ -292,10 +325,10 @@ async function extractFrames(videoBlob, no_of_frames_to_send) {
     if (show_logs) { console.log('JS: [4a/n] Final: Frames: ', frames.length); }
     if (show_logs) { console.log('JS: [4b/n] Final: Timestamps: ', timestamps.length); }
 
-    document.getElementById('videoData').value = JSON.stringify(frames);
-    document.getElementById('timestamps').value = JSON.stringify(timestamps);
+    frameBlobs = frames;
+    frameTimestamps = timestamps;
 
-    if (show_logs) { console.log('JS: [n/n] Form data updated'); }
+    if (show_logs) { console.log('JS: [n/n] Frames ready to upload'); }
 
     // Enable submit button
     document.getElementById('extracting_wait').style.display = 'none';
@@ -307,13 +340,52 @@ async function extractFrames(videoBlob, no_of_frames_to_send) {
 // Form submission:
 // ======================================================================================
 
-// submit these: num_students, student_names, video_data, timestamps
-// vid data is no_of_frames_to_send images in base64
+// 4 byte big endian size prefix (same as the socket protocol):
+function sizePrefix(size) {
+    const prefix = new Uint8Array(4);
+    new DataView(prefix.buffer).setUint32(0, size);
+    return prefix;
+}
+
+
+// Binary frame stream, per frame: [header size][header json][image size][image]
+// The Blob only references the frame Blobs, the browser streams it while uploading.
+function buildFrameStream(blobs, timestamps) {
+    const encoder = new TextEncoder();
+    const parts = [];
+    blobs.forEach((blob, i) => {
+        const header = encoder.encode(JSON.stringify({ timestamp: timestamps[i], type: blob.type }));
+        parts.push(sizePrefix(header.length), header, sizePrefix(blob.size), blob);
+    });
+    return new Blob(parts, { type: 'application/octet-stream' });
+}
+
+
+// submit these: frame_count, processing_mode, recognition_profile (query params)
+// and the no_of_frames_to_send frames as a binary stream
 function submitForm() {
     console.log('JS: Submit form activated')
     const form = document.getElementById('uploadForm');
     const formData = new FormData(form);
 
+    const params = new URLSearchParams();
+    ['frame_count', 'processing_mode', 'recognition_profile'].forEach(name => {
+        params.append(name, formData.get(name) || '');
+    });
+
+    // Either the video (frames extracted on the server) or the frames extracted here:
+    let url = '/upload_frames';
+    let body;
+    if (extract_on_server) {
+        params.append('start', startTimestamp.toLocaleString('en-IN', { timeZone: 'Asia/Kolkata' }));
+        params.append('duration', endTimestamp - startTimestamp);
+        url = '/upload_recording';
+        body = recordedVideo;
+    }
+    else {
+        body = buildFrameStream(frameBlobs, frameTimestamps);
+    }
+
     // show_logs
     temp = formData;
 
@@ -321,9 +393,10 @@ function submitForm() {
     document.getElementById('proc_stat').style.display = 'block';
 
 
-    fetch('/upload_video', {
+    fetch(`${url}?${params}`, {
         method: 'POST',
-        body: formData
+        headers: { 'Content-Type': 'application/octet-stream' },
+        body: body
     }).then(response => response.json())
         .then(data => {
             console.log(data);
@@ -332,7 +405,7 @@ function submitForm() {
                 console.log("JS: Vid Sent Successfully");
                 document.getElementById('upload_status').innerHTML = "<p>✅ Video Sent Successfully!<p>";
 
-                calculate_attendance();
+                calculate_attendance(data.session_id);
             }
         });
 }
@@ -342,25 +415,47 @@ function submitForm() {
 // Result part:
 // ======================================================================================
 
-function calculate_attendance() {
+// The uploaded session only, other classes may be processed at the same time:
+function calculate_attendance(session_id) {
     console.log('JS: Started attendance calculation on server!')
 
-    fetch('/calc_attendance', {
-        method: 'GET',
+    fetch(`/calc_attendance?session_id=${encodeURIComponent(session_id)}`, {
+        method: 'POST',
     }).then(response => response.json())
         .then(data => {
-            console.log("Attendance status: ", data);
+            console.log("Attendance job: ", data);
+            follow_job(data.job_id);
+        })
+}
 
-            if (data.status === 'completed') {
-                console.log('JS: Attendance calculation Completed!')
-                console.log('JS: Getting results from server!')
-                window.location.href = '/results';
-            }
 
-            else {
-                window.alert("Sorry, some error occurred on server side!")
-            }
-        })
+// Follow the progress of the attendance job till it is finished:
+function follow_job(job_id) {
+    const events = new EventSource(`/jobs/${job_id}/events`);
+
+    events.onmessage = (event) => {
+        const job = JSON.parse(event.data);
+        const progress = job.progress;
+
+        if (progress && job.status === 'running') {
+            const eta = progress.eta === null ? '...' : `${Math.round(progress.eta)} secs`;
+            document.getElementById('upload_status').innerHTML =
+                `<p>⏳ Processed ${progress.frames_done} / ${progress.frames_total} frames (ETA: ${eta})<p>`;
+        }
+
+        if (job.status === 'completed') {
+            events.close();
+            console.log('JS: Attendance calculation Completed!')
+            console.log('JS: Getting results from server!')
+            window.location.href = `/results?session_id=${encodeURIComponent(job.session_id)}`;
+        }
+
+        else if (job.status === 'failed' || job.status === 'cancelled') {
+            events.close();
+            console.log("Attendance job: ", job);
+            window.alert("Sorry, some error occurred on server side!")
+        }
+    };
 }
 
 
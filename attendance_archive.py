@@ -0,0 +1,233 @@
+import os
+import threading
+import numpy as np
+from dotenv import load_dotenv
+
+
+# ------------------------------------------------------------------------------
+# Columnar archive of all the compiled sessions:
+# ------------------------------------------------------------------------------
+# Every compiled register is appended as one chunk (`<session_id>.npz`) with
+# one row per student and the columns:
+#   reg_no, name, present (frames), percentage, status (present / absent)
+# plus the frames count and the first frame key of the session.
+#
+# Queries concatenate all the chunks into flat arrays once (cached in memory,
+# extended when new chunks show up), the aggregates are then computed with
+# np.unique / np.bincount instead of looping over sessions and students.
+# Chunks are written by the coordinator and read by every web worker, so each
+# process checks the chunk files (replaced / removed ones reload its cache).
+# ------------------------------------------------------------------------------
+
+load_dotenv()
+
+ARCHIVE_FOLDER = os.environ.get(
+    'archive_folder', os.path.join(os.environ.get('jsons_folder', 'Jsons'), 'archive'))
+
+_lock = threading.Lock()
+
+# Concatenated columns of all the loaded chunks:
+_columns = None
+_loaded = []            # session ids, in the same order as the chunks are stacked
+_stamps = {}            # session id -> (inode, mtime, size) of its loaded chunk file
+
+
+# ------------------------------------------------------------------------------
+# Appending:
+# ------------------------------------------------------------------------------
+
+
+def get_chunk_path(session_id: str) -> str:
+    return os.path.join(ARCHIVE_FOLDER, f'{session_id}.npz')
+
+
+def append_session(session_id: str, register: dict, frames_count: int, started_at: int = -1):
+    """Appends the compiled register of the session to the archive (replaces it if re-compiled)."""
+    os.makedirs(ARCHIVE_FOLDER, exist_ok=True)
+    students = list(register.values())
+
+    chunk = {
+        'reg_no': np.array([str(stud['Reg_No']) for stud in students], dtype=str),
+        'name': np.array([str(stud['Name']) for stud in students], dtype=str),
+        'present': np.array([sum(stud['Attendance'].values()) for stud in students], dtype=np.int32),
+        'percentage': np.array([stud['Percentage'] for stud in students], dtype=np.int16),
+        'status': np.array([stud['Status'] == 'Present' for stud in students], dtype=bool),
+        'frames': np.array(frames_count, dtype=np.int32),
+        'started_at': np.array(started_at, dtype=np.int64),
+    }
+
+    # Write to a temp file first, so a query never loads a half written chunk:
+    path = get_chunk_path(session_id)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        np.savez(file, **chunk)
+    os.replace(temp_path, path)
+
+
+def list_sessions() -> list:
+    return sorted(get_chunk_stamps())
+
+
+def get_chunk_stamps() -> dict:
+    """session id -> (inode, mtime, size) of its chunk file, a re-compiled chunk has a new one."""
+    if not os.path.isdir(ARCHIVE_FOLDER):
+        return {}
+    stamps = {}
+    with os.scandir(ARCHIVE_FOLDER) as entries:
+        for entry in entries:
+            if entry.name.endswith('.npz'):
+                stat = entry.stat()
+                stamps[entry.name[:-4]] = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+# ------------------------------------------------------------------------------
+# Loading:
+# ------------------------------------------------------------------------------
+
+
+def load_chunk(session_id: str, index: int) -> dict:
+    with np.load(get_chunk_path(session_id)) as chunk:
+        rows = len(chunk['reg_no'])
+        return {
+            'reg_no': chunk['reg_no'],
+            'name': chunk['name'],
+            'present': chunk['present'],
+            'percentage': chunk['percentage'],
+            'status': chunk['status'],
+            'session': np.full(rows, index, dtype=np.int32),
+            'frames': np.full(rows, int(chunk['frames']), dtype=np.int32),
+            'started_at': int(chunk['started_at']),
+        }
+
+
+def get_columns() -> dict:
+    """All the archived rows as flat columns (only the new chunks are read from disk),
+    `session_ids` are the sessions in the order of the `session` column."""
+    global _columns
+    with _lock:
+        stamps = get_chunk_stamps()
+
+        # Re-compiled (or removed) session, its old rows are in the cache:
+        if any(stamps.get(session_id) != stamp for session_id, stamp in _stamps.items()):
+            _columns = None
+            _loaded.clear()
+            _stamps.clear()
+
+        new_sessions = sorted(s for s in stamps if s not in _stamps)
+        if _columns is not None and not new_sessions:
+            return _columns
+
+        chunks = [load_chunk(session_id, len(_loaded) + i)
+                  for i, session_id in enumerate(new_sessions)]
+
+        if _columns is None:
+            _columns = {
+                'reg_no': np.array([], dtype=str), 'name': np.array([], dtype=str),
+                'present': np.array([], dtype=np.int32), 'percentage': np.array([], dtype=np.int16),
+                'status': np.array([], dtype=bool), 'session': np.array([], dtype=np.int32),
+                'frames': np.array([], dtype=np.int32), 'started_at': np.array([], dtype=np.int64),
+                'session_ids': [],
+            }
+
+        if chunks:
+            columns = {name: np.concatenate([_columns[name]] + [chunk[name] for chunk in chunks])
+                       for name in ('reg_no', 'name', 'present', 'percentage', 'status', 'session', 'frames')}
+            columns['started_at'] = np.concatenate(
+                [_columns['started_at'], np.array([chunk['started_at'] for chunk in chunks], dtype=np.int64)])
+            _loaded.extend(new_sessions)
+            _stamps.update((session_id, stamps[session_id]) for session_id in new_sessions)
+            columns['session_ids'] = list(_loaded)
+            _columns = columns
+
+        return _columns
+
+
+# ------------------------------------------------------------------------------
+# Queries:
+# ------------------------------------------------------------------------------
+
+
+def get_student_summary(below: float = None) -> list:
+    """
+    Per student aggregates over all the archived sessions.
+
+    Args:
+        below (float): Only the students whose session attendance % is below this.
+
+    Returns:
+        list: [{Reg_No, Name, Sessions, Attended, Attendance (% of sessions),
+            Mean_Percentage (of frames), Frames_Present, Frames_Total}, ...] sorted by Reg_No.
+    """
+    columns = get_columns()
+    if len(columns['reg_no']) == 0:
+        return []
+
+    reg_nos, rows = np.unique(columns['reg_no'], return_inverse=True)
+    count = len(reg_nos)
+
+    sessions = np.bincount(rows, minlength=count)
+    attended = np.bincount(rows, weights=columns['status'], minlength=count)
+    percentage_sum = np.bincount(rows, weights=columns['percentage'], minlength=count)
+    frames_present = np.bincount(rows, weights=columns['present'], minlength=count)
+    frames_total = np.bincount(rows, weights=columns['frames'], minlength=count)
+
+    attendance = np.round(attended / sessions * 100, 2)
+    mean_percentage = np.round(percentage_sum / sessions, 2)
+
+    # Latest name of each student (rows are stacked in session order):
+    last_row = np.zeros(count, dtype=np.int64)
+    np.maximum.at(last_row, rows, np.arange(len(rows)))
+    names = columns['name'][last_row]
+
+    selected = np.arange(count) if below is None else np.flatnonzero(attendance < below)
+    return [{
+        'Reg_No': str(reg_nos[i]),
+        'Name': str(names[i]),
+        'Sessions': int(sessions[i]),
+        'Attended': int(attended[i]),
+        'Attendance': float(attendance[i]),
+        'Mean_Percentage': float(mean_percentage[i]),
+        'Frames_Present': int(frames_present[i]),
+        'Frames_Total': int(frames_total[i]),
+    } for i in selected]
+
+
+def get_session_summary() -> list:
+    """Per session aggregates: students present / absent and the mean frame percentage."""
+    columns = get_columns()
+    sessions = columns['session_ids']
+    count = len(sessions)
+    if count == 0:
+        return []
+
+    rows = columns['session']
+    students = np.bincount(rows, minlength=count)
+    present = np.bincount(rows, weights=columns['status'], minlength=count)
+    percentage_sum = np.bincount(rows, weights=columns['percentage'], minlength=count)
+
+    frames = np.zeros(count, dtype=np.int64)
+    frames[rows] = columns['frames']
+
+    return [{
+        'Session': session_id,
+        'Started_At': int(columns['started_at'][i]),
+        'Frames': int(frames[i]),
+        'Students': int(students[i]),
+        'Present': int(present[i]),
+        'Absent': int(students[i] - present[i]),
+        'Mean_Percentage': round(float(percentage_sum[i] / max(students[i], 1)), 2),
+    } for i, session_id in enumerate(sessions)]
+
+
+def get_student_history(reg_no: str) -> list:
+    """Session wise attendance of one student."""
+    columns = get_columns()
+    rows = np.flatnonzero(columns['reg_no'] == str(reg_no))
+    return [{
+        'Session': columns['session_ids'][columns['session'][row]],
+        'Present': int(columns['present'][row]),
+        'Frames': int(columns['frames'][row]),
+        'Percentage': int(columns['percentage'][row]),
+        'Status': 'Present' if columns['status'][row] else 'Absent',
+    } for row in rows]
@@ -0,0 +1,45 @@
+import time
+import queue
+import threading
+
+
+# ------------------------------------------------------------------------------
+# Batching loop shared by the background writers:
+# ------------------------------------------------------------------------------
+# (network logs, session store and the client's JSON-lines logs)
+# The producers only put items in a queue, the writer thread runs:
+#
+#   for items, flushes in collect_batches(source, max_batch, interval):
+#       write(items)
+#       for done in flushes:
+#           done.set()
+#
+# - A threading.Event in the queue is a flush request, the batch is cut there
+#   so the waiting thread is woken up as soon as its writes are done.
+# - None in the queue stops the loop (after its batch is yielded).
+# ------------------------------------------------------------------------------
+
+
+def collect_batches(source: queue.Queue, max_batch: int, interval: float):
+    """
+    Yields (items, flush requests) of every batch, at most `max_batch` entries,
+    an item waits at most `interval` seconds for the rest of its batch.
+    """
+    while True:
+        batch = [source.get()]
+        deadline = time.monotonic() + interval
+
+        while (len(batch) < max_batch and batch[-1] is not None
+               and not isinstance(batch[-1], threading.Event)):
+            try:
+                batch.append(source.get(timeout=max(deadline - time.monotonic(), 0)))
+            except queue.Empty:
+                break
+
+        items = [item for item in batch
+                 if item is not None and not isinstance(item, threading.Event)]
+        flushes = [item for item in batch if isinstance(item, threading.Event)]
+        yield items, flushes
+
+        if batch[-1] is None:
+            return
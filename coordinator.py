@@ -0,0 +1,260 @@
+import startup
+import os
+import json
+import socket
+import select
+import threading
+import socketserver
+from dotenv import load_dotenv
+
+
+# ------------------------------------------------------------------------------
+# Coordinator process (distributed server + attendance jobs):
+# ------------------------------------------------------------------------------
+# The distributed server (client sockets, scheduler, live registers) and the
+# attendance jobs live in this one long-lived process:
+#   python coordinator.py
+#
+# The web tier (app.py) keeps no state of its own, its workers (any number of
+# processes, ex. `gunicorn -w 4 app:app`) reach the coordinator over a local
+# UNIX socket (TCP on localhost where UNIX sockets are not available) with
+# call('name', *args). Uploaded frames and sessions are shared through the
+# upload folder and the session store, only the calls go over the socket.
+#
+# Messages use the same framing as the client protocol (4 byte big endian
+# size prefix) with a JSON body:
+#   request:  {"call": name, "args": [...], "kwargs": {...}}
+#   response: {"result": ...} or {"error": message}
+# ------------------------------------------------------------------------------
+
+load_dotenv()
+
+SOCKET_PATH = os.environ.get(
+    'coordinator_socket', os.path.join(os.environ.get('jsons_folder', 'Jsons'), 'coordinator.sock'))
+PORT = int(os.environ.get('coordinator_port', 12346))
+USE_UNIX_SOCKET = hasattr(socket, 'AF_UNIX')
+
+INFO = '\033[94m[INFO]\033[0m'
+WARN = '\033[93m[WARN]\033[0m'
+ERROR = '\033[91m[ERROR]\033[0m'
+
+# One connection per (worker) thread, kept open between calls:
+_local = threading.local()
+
+
+# ------------------------------------------------------------------------------
+# Framing:
+# ------------------------------------------------------------------------------
+
+
+def send_frame(sock, data: dict):
+    body = json.dumps(data, default=str).encode('utf-8')
+    sock.sendall(len(body).to_bytes(4, 'big') + body)
+
+
+def recv_frame(sock) -> dict | None:
+    """Next message, None if the other side closed the connection."""
+    size = recv_exactly(sock, 4)
+    if size is None:
+        return None
+    body = recv_exactly(sock, int.from_bytes(size, 'big'))
+    if body is None:
+        raise ConnectionError("Connection closed in the middle of a message.")
+    return json.loads(body.decode('utf-8'))
+
+
+def recv_exactly(sock, size: int) -> bytes | None:
+    data = b''
+    while len(data) < size:
+        packet = sock.recv(size - len(data))
+        if not packet:
+            return None
+        data += packet
+    return data
+
+
+# ------------------------------------------------------------------------------
+# Web tier side:
+# ------------------------------------------------------------------------------
+
+
+def connect() -> socket.socket:
+    if USE_UNIX_SOCKET:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(SOCKET_PATH)
+        except OSError:
+            sock.close()
+            raise
+    else:
+        sock = socket.create_connection(('127.0.0.1', PORT))
+    return sock
+
+
+def get_connection() -> socket.socket:
+    """The thread's kept connection, a new one if the coordinator closed it (ex. restarted)."""
+    sock = getattr(_local, 'sock', None)
+
+    # An idle connection is only readable once the coordinator closed it:
+    if sock is not None and select.select([sock], [], [], 0)[0]:
+        _local.sock = None
+        sock.close()
+        sock = None
+
+    if sock is None:
+        try:
+            sock = _local.sock = connect()
+        except OSError as e:
+            raise ConnectionError(f"Coordinator is not reachable: {e}") from e
+    return sock
+
+
+def call(name: str, *args, **kwargs):
+    """
+    Runs the function `name` (see get_handlers) in the coordinator process.
+
+    Raises:
+        ConnectionError: The coordinator is not running, or the connection was
+            lost during the call (not retried, it may have run).
+        RuntimeError: The call itself failed in the coordinator.
+    """
+    request = {'call': name, 'args': args, 'kwargs': kwargs}
+    sock = get_connection()
+
+    # Not retried once the request is sent, the call may already have run:
+    try:
+        send_frame(sock, request)
+        response = recv_frame(sock)
+        if response is None:
+            raise ConnectionError("Coordinator closed the connection.")
+    except OSError as e:
+        _local.sock = None
+        sock.close()
+        raise ConnectionError(f"Coordinator connection lost during `{name}`: {e}") from e
+
+    if 'error' in response:
+        raise RuntimeError(f"Coordinator `{name}` failed: {response['error']}")
+    return response['result']
+
+
+# ------------------------------------------------------------------------------
+# Coordinator side:
+# ------------------------------------------------------------------------------
+
+
+def get_handlers() -> dict:
+    """The calls the web tier can make (imported here, the web tier never imports them)."""
+    import jobs
+    import logger
+    import metrics
+    import tracing
+    import distributed_server
+
+    def start_upload(session_id: str, settings: dict):
+        # A new trace, unless other sessions are still running (then it is shared):
+        if not distributed_server.get_active_sessions():
+            tracing.start_trace()
+        if settings['pipeline']:
+            distributed_server.start_pipeline(
+                session_id, settings['frame_count'] or 0, settings['recognition_profile'],
+                settings['priority'])
+
+    return {
+        'start_upload': start_upload,
+        'submit_frame': distributed_server.submit_frame,
+        'finish_pipeline': distributed_server.finish_pipeline,
+        'cancel_session': distributed_server.cancel,
+        'add_spans': tracing.add_spans,
+        'submit_job': jobs.submit,
+        'get_job': jobs.get_job,
+        'cancel_job': jobs.cancel,
+        'get_provisional': distributed_server.get_provisional,
+        'get_progress': distributed_server.get_progress,
+        'get_active_sessions': distributed_server.get_active_sessions,
+        'render_metrics': metrics.render,
+        'query_logs': logger.query_logs,
+        'wait_for_logs': logger.wait_for_logs,
+    }
+
+
+class RequestHandler(socketserver.BaseRequestHandler):
+    """Serves the calls of one web tier connection, one at a time."""
+
+    def handle(self):
+        handlers = self.server.handlers
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+
+            handler = handlers.get(request.get('call'))
+            if handler is None:
+                response = {'error': f"Unknown call `{request.get('call')}`"}
+            else:
+                try:
+                    response = {'result': handler(*request.get('args', []), **request.get('kwargs', {}))}
+                except Exception as e:
+                    print(f"{ERROR} Coordinator `{request['call']}` failed: {e}")
+                    response = {'error': str(e)}
+
+            try:
+                send_frame(self.request, response)
+            except OSError:
+                return
+
+
+if USE_UNIX_SOCKET:
+    class CoordinatorServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+else:
+    class CoordinatorServer(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+
+def serve():
+    """Starts the distributed server and serves the web tier right away, the clients
+    are accepted in the background (sessions wait until some client is ready)."""
+    startup.mark('import coordinator')
+    import distributed_server
+    startup.mark('import distributed server')
+
+    distributed_server.start_server()
+    distributed_server.accept_clients()
+    startup.mark('start distributed server')
+
+    if USE_UNIX_SOCKET:
+        # Left over by a coordinator which did not shut down cleanly:
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+        folder = os.path.dirname(SOCKET_PATH)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        server = CoordinatorServer(SOCKET_PATH, RequestHandler)
+        address = SOCKET_PATH
+    else:
+        server = CoordinatorServer(('127.0.0.1', PORT), RequestHandler)
+        address = f'127.0.0.1:{PORT}'
+
+    server.handlers = get_handlers()
+    startup.mark('start coordinator socket')
+    print(f"{INFO} Coordinator listening at `{address}`")
+    startup.report('coordinator')
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{WARN} Coordinator stopped.")
+    finally:
+        server.server_close()
+        if USE_UNIX_SOCKET and os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+        distributed_server.release_clients()
+        distributed_server.stop_server()
+
+
+if __name__ == '__main__':
+    serve()
@@ -3,8 +3,13 @@ import time
 import json
 import socket
 import threading
+from collections import deque
+import metrics
+import tracing
 import logger as l
-from typing import Literal
+import session_store
+import attendance_archive
+from live_register import LiveRegister
 from datetime import datetime
 from dotenv import load_dotenv
 from networking import receive_message, send_message, handle_recv, handle_send
@@ -22,24 +27,37 @@ CLASS_REGISTER = os.environ.get('class_register')
 UPLOADS = os.environ.get('upload_folder')
 MODELS = os.environ.get('face_models_folder')
 
-UPLOADED_DATA = os.environ.get('uploaded_data')
-ATTENDANCE_LOG_FILE = os.environ.get('attendance_raw_file')
-ATTENDANCE_REGISTER = os.environ.get('class_attendance')
-
 # Required server configurations:
 HOST = str(os.environ.get('server_host'))
 PORT = int(os.environ.get('server_port'))
 TIMEOUT = int(os.environ.get('server_timeout'))
 NO_OF_CLIENTS = int(os.environ.get('no_of_clients'))
 
+# Early termination (dynamic mode): stop once every student's status is decided,
+# optionally still process the frames which can change First_In / Last_In:
+EARLY_STOP = os.environ.get('early_stop', 'False') == 'True'
+EARLY_STOP_KEEP_BOUNDARIES = os.environ.get('early_stop_keep_boundaries', 'True') == 'True'
+
+# Adaptive mode: gap between the frames of the first (coarse) round:
+ADAPTIVE_COARSE_STEP = int(os.environ.get('adaptive_coarse_step', 4))
+
+# Recognition profile of the sessions which do not pick one, the names are
+# defined by the clients (Client/attendance.py), each reports them at 'Ready':
+DEFAULT_PROFILE = os.environ.get('recognition_profile', 'balanced')
+
 # Global clients dictionary to access clients from anywhere:
 clients = {}
 # 'sample_client_3': {
 #     'name': 'Sample Client',
 #     'socket': "python_data",
 #     'address': "192.168.13.12",
-#     'is_free': True, # For dynamic load balancing only
-#    'task_count': 0, # For dynamic load balancing only
+#     'is_free': True,     # Not processing a task
+#     'task_count': 0,     # Tasks sent so far
+#     'session': None,     # Session whose settings the client has (see bind_client)
+#     'mode': None,        # None (waiting for settings) / 'dynamic' / 'static'
+#     'static_left': 0,    # Static images announced but not sent yet
+#     'warm_latency': 0.2, # Warm per-frame seconds the client measured (see 'Ready')
+#     'profiles': [...],   # Recognition profiles the client knows (see 'Ready')
 # }
 
 # Global server socket to access from anywhere:
@@ -49,7 +67,21 @@ for i in range(NO_OF_CLIENTS):
     clients[str(i + 1)] = None
 
 lock = threading.Lock()
-responses = []
+
+# Network logs go to the session store:
+l.set_log_store(session_store)
+
+# Sessions by id (see Session), the frames of all the active sessions are
+# interleaved over the shared clients by the scheduler (see pick_task):
+sessions = {}
+latest_session_id = None
+KEEP_SESSIONS = int(os.environ.get('keep_sessions', 20))   # finished ones kept for progress queries
+
+# Notified whenever a task is queued / done, a client gets free, a session is cancelled:
+work_ready = threading.Condition(lock)
+scheduler_thread = None
+
+STAGE_TIMINGS_FILE = os.path.join(os.environ.get('jsons_folder'), 'stage_timings.json')
 
 # Console logging modes:
 INFO = '\033[94m[INFO]\033[0m'
@@ -61,11 +93,88 @@ ERROR = '\033[91m[ERROR]\033[0m'
 # ------------------------------------------------------------------------------
 
 
-def append_response(response):
-    with lock:
-        responses.append(response)
-        with open(ATTENDANCE_LOG_FILE, 'w') as file:
-            json.dump(responses, file, indent=4)
+def append_response(session, response, client_id=None):
+    with tracing.Span('store result', 'results',
+                      tracing.get_trace_id(session.session_id, response['frame_key'])):
+        # Queued, committed in batches by the session store's writer thread:
+        session_store.add_result(session.session_id, response, client_id)
+
+        with lock:
+            if client_id is not None:
+                update_stage_stats(session.stage_stats, str(client_id), response)
+                update_tracking_stats(session.tracking_stats, str(client_id), response)
+                session.client_frames[str(client_id)] = session.client_frames.get(str(client_id), 0) + 1
+
+        if client_id is not None:
+            metrics.inc('frames_processed_total', client=client_id)
+            metrics.mark('frames_per_second', client=client_id)
+            for result, count in response.get('face_tracking', {}).items():
+                metrics.inc('face_encodings_total', count, client=client_id, result=result)
+
+        # Fold the result into the register right away:
+        session.live_register.add_response(response)
+
+    # Last frame landed, the register is final:
+    if session.live_register.is_complete():
+        finish_live_register(session)
+
+
+def update_stage_stats(stage_stats: dict, client_id: str, response: dict):
+    """Adds the per stage timings (ns) of one response to the client's aggregate"""
+    stages = response.get('time_records', {}).get('stages_ns', {})
+    client_stats = stage_stats.setdefault(client_id, {})
+
+    for stage, time_ns in stages.items():
+        stats = client_stats.setdefault(
+            stage, {'count': 0, 'total_ns': 0, 'max_ns': 0})
+        stats['count'] += 1
+        stats['total_ns'] += time_ns
+        stats['max_ns'] = max(stats['max_ns'], time_ns)
+
+
+def update_tracking_stats(tracking_stats: dict, client_id: str, response: dict):
+    """Adds the faces encoded / encodings avoided (static mode face tracking) of one response"""
+    counts = response.get('face_tracking')
+    if counts is None:
+        return
+
+    client_stats = tracking_stats.setdefault(
+        client_id, {'faces_encoded': 0, 'encodings_avoided': 0})
+    for key in client_stats:
+        client_stats[key] += counts.get(key, 0)
+
+
+def get_stage_summary(stage_stats: dict) -> dict:
+    """Mean / max / share of total time (in ms) of each stage, per client"""
+    summary = {}
+    for client_id, client_stats in stage_stats.items():
+        client_total = sum(s['total_ns'] for s in client_stats.values()) or 1
+        summary[client_id] = {
+            stage: {
+                'count': s['count'],
+                'mean_ms': round(s['total_ns'] / s['count'] / 1e6, 3),
+                'max_ms': round(s['max_ns'] / 1e6, 3),
+                'total_ms': round(s['total_ns'] / 1e6, 3),
+                'share_percent': round(s['total_ns'] / client_total * 100, 2),
+            } for stage, s in client_stats.items()
+        }
+    return summary
+
+
+def save_stage_summary(session, debug: bool = False):
+    """Stage timings of the session (the file has the last finished session's)."""
+    summary = get_stage_summary(session.stage_stats)
+    with open(STAGE_TIMINGS_FILE, 'w') as f:
+        json.dump(summary, f, indent=4)
+
+    if debug:
+        for client_id, stages in summary.items():
+            print(f"{INFO} Client {client_id} stage timings ({session.session_id}):")
+            for stage, s in sorted(stages.items(), key=lambda x: -x[1]['total_ms']):
+                print(f"\t{stage.ljust(10)} : mean {s['mean_ms']} ms, max {s['max_ms']} ms ({s['share_percent']}%)")
+        for client_id, counts in session.tracking_stats.items():
+            print(f"{INFO} Client {client_id} face tracking: {counts['encodings_avoided']} encodings avoided, "
+                  f"{counts['faces_encoded']} faces encoded.")
 
 
 def get_timestamp():
@@ -127,10 +236,39 @@ def get_clients():
     return True
 
 
+def accept_clients() -> threading.Thread:
+    """Like get_clients, but in the background: the coordinator serves meanwhile and
+    the scheduler uses every client as soon as its initialization is complete."""
+
+    def accept_loop():
+        print(f"{INFO} Accepting {NO_OF_CLIENTS} clients in the background...")
+        while True:
+            # All slots taken, a slot is freed again if a client fails to initialize:
+            if all(client is not None for client in clients.values()):
+                time.sleep(1)
+                continue
+            try:
+                client_socket, client_address = server_socket.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return      # Server socket closed (shut down)
+
+            threading.Thread(
+                target=handle_client_initialization,
+                args=(client_socket, client_address, True),
+                daemon=True
+            ).start()
+
+    thread = threading.Thread(target=accept_loop, daemon=True)
+    thread.start()
+    return thread
+
+
 def release_clients():
     """Release all the clients connected to the server."""
     for client_id, client in clients.items():
-        if client is not None:
+        if isinstance(client, dict):
             client['socket'].close()
             clients[client_id] = None
     print(f"{WARN} All clients released.")
@@ -177,8 +315,13 @@ def handle_client_initialization(client_socket, client_address, slow=False):
             "name": client_name,
             "socket": client_socket,
             "address": client_address,
-            "is_free": True,     # For dynamic load balancing only
-            "task_count": 0      # For dynamic load balancing only
+            "is_free": False,    # Free once it reports ready (see below)
+            "task_count": 0,
+            "session": None,
+            "mode": None,
+            "static_left": 0,
+            "warm_latency": None,
+            "profiles": [],
         }
 
         print(f"{INFO} Client {client_id} : Connected Successfully {client_address} - `{client_name}`")
@@ -218,6 +361,24 @@ def handle_client_initialization(client_socket, client_address, slow=False):
             topic='Initialization - Models', status='Success',
             client_id=client_id, message=f'Sent all the face models successfully.')
 
+        # R2 - Wait till the client has warmed up (its first frame is not a cold one),
+        # it also reports the recognition profiles it knows:
+        resp = handle_recv(
+            *receive_message(client_socket), expected_topic='Ready',
+            log_client_id=client_id, log_topic='Initialization - Ready',
+            log_success_message='Client warmed up and ready.')
+        ready = json.loads(resp['message'])
+        warm_latency = float(ready['warm_latency'])
+        metrics.set_gauge('client_warm_seconds', warm_latency, client=client_id)
+        print(f"{INFO} Client {client_id} : Ready, warm frame latency {warm_latency:.3f} secs.")
+
+        # Ready for tasks (the scheduler may already have some waiting):
+        with lock:
+            clients[client_id]['warm_latency'] = warm_latency
+            clients[client_id]['profiles'] = list(ready['profiles'])
+            clients[client_id]['is_free'] = True
+            work_ready.notify_all()
+
         # Mark end of initialization phase
         msg = f"{INFO} Client {client_id} : Initialization phase completed."
         print(msg)
@@ -229,85 +390,471 @@ def handle_client_initialization(client_socket, client_address, slow=False):
             topic='Connection', status='Error', client_id=client_id,
             message=f'Client {client_id} - `{client_name}` connection error: {e}')
         print(f"[ERROR] Client {client_id} Initialization Error \n\t{e}")
+        # Free the slot for a reconnect:
+        client_socket.close()
+        if client_id:
+            clients[client_id] = None
 
 
 # ------------------------------------------------------------------------------
-# Static Load Balancing Functions:
+# Sending one frame to a client:
 # ------------------------------------------------------------------------------
 
 
-def static_mode_thread(image_list, timestamp_list, client_id):
-    """Threaded function to handle the static load balancing."""
-
+def process_on_client(client_id, topic: str, image: str, frame_key: int,
+                      label: str, send_log_topic: str, session_id: str) -> dict:
+    """Sends the frame (with its session id and frame key as the trace id) to the client and
+    waits for its processed data. Timed (metrics) and traced (tracing) per frame."""
     client_socket = clients[str(client_id)]['socket']
-    client_name = clients[str(client_id)]['name']
+    trace_id = tracing.get_trace_id(session_id, frame_key)
+    lane = f'client {client_id} dispatch'
+
+    metrics.inc('tasks_in_flight', 1, client=client_id)
+    try:
+        with metrics.Timer('task_seconds', client=client_id):
+            sent_ns = time.time_ns()
+            handle_send(*send_message(
+                client_socket, topic=topic, message=str(frame_key),
+                file_path=image, trace_id=trace_id),
+                log_topic=send_log_topic, log_client_id=client_id,
+                log_success_message=f'{label} - [{frame_key}] sent successfully.')
+            print(f"{INFO} Client {client_id} : {label} - [{frame_key}] sent.")
+
+            waiting_ns = time.time_ns()
+            resp = handle_recv(
+                *receive_message(client_socket), expected_topic='Processed Data',
+                log_topic='Load Balancing - Processed Data', log_client_id=client_id,
+                log_success_message=f'{label} - [{frame_key}] processed successfully.')
+            received_ns = time.time_ns()
+    finally:
+        metrics.inc('tasks_in_flight', -1, client=client_id)
+
+    processed_data = json.loads(resp['message'])
+
+    tracing.record('send frame', sent_ns, waiting_ns, lane, trace_id)
+    tracing.record('wait for result', waiting_ns, received_ns, lane, trace_id)
+    tracing.add_client_spans(client_id, processed_data.pop('trace', None), sent_ns, received_ns)
+    return processed_data
+
+
+# ------------------------------------------------------------------------------
+# Sessions:
+# ------------------------------------------------------------------------------
+# Every attendance session has its own task queue, register, progress and
+# cancel flag, so several classes can be processed at the same time.
+# A task is (image, frame key), static mode pins its tasks to a client
+# (the client is told its image count up front, see bind_client).
+# ------------------------------------------------------------------------------
+
+
+class Session:
+    """State of one attendance session (see start_session)."""
+
+    def __init__(self, session_id: str, processing_mode: str, profile: str,
+                 priority: int, live_register: LiveRegister):
+        self.session_id = session_id
+        self.processing_mode = processing_mode.lower()
+        self.profile = profile
+        self.priority = max(int(priority), 1)   # share of the clients vs the other sessions
+        self.live_register = live_register
+
+        # Scheduling:
+        self.tasks = deque()                # [(image, frame key)], for any client
+        self.pinned = {}                    # client id -> deque of its (static) tasks
+        self.in_flight = 0
+        self.virtual_time = 0.0             # tasks dispatched / priority (fair share)
+        self.total_tasks = 0
+        self.early_stop = False
+        self.finished = False
+
+        # Progress:
+        self.started_at = time.time()
+        self.client_frames = {}
+        self.stage_stats = {}
+        self.tracking_stats = {}            # client id -> faces encoded / encodings avoided
+        self.cancel_event = threading.Event()
+        self.register_saved = False
+
+        # Pipeline mode (frames are added while the upload is going on):
+        self.closed = threading.Event()
+        self.pipeline_frames = 0
+        self.pipeline_thread = None
+
+    def queued(self) -> int:
+        return len(self.tasks) + sum(len(tasks) for tasks in self.pinned.values())
+
+    def is_idle(self) -> bool:
+        return self.queued() == 0 and self.in_flight == 0
+
+
+def start_session(session_id: str, expected_frames: int, processing_mode: str = 'dynamic',
+                  profile: str = None, priority: int = 1, duplicates: list = None,
+                  streaming: bool = False) -> Session:
+    """Creates the session and its in-memory register, every response is folded into it on arrival."""
+    global latest_session_id
+    live_register = LiveRegister(
+        load_class_register(), expected_frames=expected_frames,
+        duplicates=duplicates, streaming=streaming)
+    session = Session(session_id, processing_mode, get_profile(profile), priority, live_register)
+
+    with lock:
+        running = sessions.get(session_id)
+        if running is not None and not running.finished:
+            raise ValueError(f"[ERROR] Session {session_id} is already being processed.")
+
+        # Joins at the current share, else it would get every client till it catches up:
+        active = [s.virtual_time for s in sessions.values() if not s.finished]
+        session.virtual_time = min(active, default=0.0)
+        sessions[session_id] = session
+        latest_session_id = session_id
+
+        # Finished sessions are only kept for the progress / provisional queries:
+        finished = [sid for sid, s in sessions.items() if s.finished]
+        for sid in finished[:max(len(finished) - KEEP_SESSIONS, 0)]:
+            del sessions[sid]
+
+    l.create_log(client_id=-1, topic='Load Balancing - Mode', status='Info',
+                 message=f"Session {session_id}: {processing_mode} ({session.profile} profile, "
+                         f"priority {session.priority})")
+    start_scheduler()
+    return session
+
+
+def get_session(session_id: str = None) -> Session:
+    """The session (the latest started one if not given), None if not known."""
+    with lock:
+        return sessions.get(session_id or latest_session_id)
+
+
+def get_active_sessions() -> list:
+    with lock:
+        return [sid for sid, s in sessions.items() if not s.finished]
+
+
+def add_tasks(session: Session, tasks: list, client_id: str = None):
+    """Queues the session's tasks (only for the given client, if given)."""
+    with lock:
+        if client_id is None:
+            session.tasks.extend(tasks)
+        else:
+            session.pinned.setdefault(client_id, deque()).extend(tasks)
+        session.total_tasks += len(tasks)
+        set_queue_depth()
+        work_ready.notify_all()
+
+
+def wait_for_session(session: Session):
+    """Waits till the queued and the sent tasks of the session are all done."""
+    with lock:
+        work_ready.wait_for(session.is_idle)
+
+
+def end_session(session: Session):
+    """Session is over, clients still in its dynamic loop are told `Done`."""
+    with lock:
+        session.finished = True
+        session.tasks.clear()
+        released = [client_id for client_id, client in clients.items()
+                    if isinstance(client, dict) and client['session'] == session.session_id
+                    and client['mode'] == 'dynamic' and client['is_free']]
+        for client_id in released:
+            clients[client_id].update(is_free=False, session=None, mode=None)
+
+    for client_id in released:
+        try:
+            send_done(client_id)
+        except Exception as e:
+            print(f"{ERROR} Client {client_id} : `Done` could not be sent: {e}")
+
+    with lock:
+        for client_id in released:
+            clients[client_id]['is_free'] = True
+        set_queue_depth()
+        work_ready.notify_all()
+
+
+def set_queue_depth():
+    """(lock held)"""
+    metrics.set_gauge('task_queue_depth', sum(s.queued() for s in sessions.values()))
+
+
+# ------------------------------------------------------------------------------
+# Scheduler (shared by all the sessions):
+# ------------------------------------------------------------------------------
+# Whenever a client is free it gets the next task of the session with the
+# least virtual time (tasks dispatched / priority), so the sessions share the
+# clients in proportion to their priority (weighted fair share). A client
+# only changes sessions between two frames, it is told `Done` (ends its
+# dynamic loop) and then the settings of its new session.
+# ------------------------------------------------------------------------------
+
+
+def start_scheduler():
+    global scheduler_thread
+    with lock:
+        if scheduler_thread is None:
+            scheduler_thread = threading.Thread(target=scheduler, daemon=True)
+            scheduler_thread.start()
+
+
+def scheduler():
+    while True:
+        with lock:
+            assignment = assign_next_task()
+            while assignment is None:
+                work_ready.wait()
+                assignment = assign_next_task()
+
+        thread = threading.Thread(target=run_task, args=assignment, daemon=True)
+        thread.start()
+
+
+def assign_next_task():
+    """Next (session, image, frame key, client id, settings) for some free client (lock held)."""
+    for client_id, client in clients.items():
+        if not isinstance(client, dict) or not client['is_free']:
+            continue
+
+        picked = pick_task(client_id)
+        if picked is None:
+            continue
+        session, (image, frame_key) = picked
+
+        # Mark busy before the thread starts:
+        client['is_free'] = False
+        client['task_count'] += 1
+        session.in_flight += 1
+        session.virtual_time += 1 / session.priority
+        set_queue_depth()
+        return session, image, frame_key, client_id, bind_client(client_id, session)
+    return None
+
+
+def pick_task(client_id: str) -> tuple:
+    """(session, task) for the free client, None if nothing is queued for it (lock held).
+    - The rest of the static images already announced to the client, else
+    - the session with the least virtual time among the ones with a task for it."""
+    client = clients[client_id]
+    if client['mode'] == 'static':
+        session = sessions[client['session']]
+        return session, session.pinned[client_id].popleft()
+
+    for session in sessions.values():
+        if session.early_stop:
+            drop_decided_tasks(session)
+
+    candidates = [s for s in sessions.values() if s.tasks or s.pinned.get(client_id)]
+    if not candidates:
+        return None
+
+    session = min(candidates, key=lambda s: (s.virtual_time, s.started_at))
+    if session.pinned.get(client_id):
+        return session, session.pinned[client_id].popleft()
+    return session, session.tasks.popleft()
+
+
+def bind_client(client_id: str, session: Session) -> tuple:
+    """Messages the client needs before the session's next task (lock held).
+
+    Returns:
+        tuple: (send `Done` first, send the session settings, static images count to announce)
+    """
+    client = clients[client_id]
+    static = session.processing_mode == 'static'
+    send_done, send_settings, static_count = False, False, 0
+
+    if client['mode'] is None or client['session'] != session.session_id:
+        send_done = client['mode'] == 'dynamic'
+        send_settings = True
+        client['session'] = session.session_id
+        client['mode'] = 'static' if static else 'dynamic'
+        if static:
+            # This task is already taken off the pinned queue:
+            static_count = client['static_left'] = len(session.pinned[client_id]) + 1
+
+    # Client goes back to waiting for settings after its last static image:
+    if static:
+        client['static_left'] -= 1
+        if client['static_left'] == 0:
+            client['mode'] = None
+
+    return send_done, send_settings, static_count
+
+
+def run_task(session: Session, image: str, frame_key: int, client_id: str, settings: tuple):
+    """Sends one frame to the client (with the settings it needs first) and saves the result."""
+    send_done_first, send_settings, static_count = settings
+    static = session.processing_mode == 'static'
+    client = clients[client_id]
+
+    try:
+        try:
+            if send_done_first:
+                send_done(client_id)
+            if send_settings:
+                send_session_settings(client_id, session.processing_mode, session.profile)
+            if static_count:
+                # S1 - Send the image count to the client:
+                handle_send(*send_message(
+                    client['socket'], topic='Static Images Count', message=static_count),
+                    log_topic='Load Balancing', log_client_id=client_id,
+                    log_success_message='Image count sent successfully.')
+
+            # S2 - Send the image with its frame key / R1 - Receive the processed data:
+            processed_data = process_on_client(
+                client_id, 'Static Image' if static else 'Dynamic Task', image, frame_key,
+                label=f"Task {client['task_count']:02d}",
+                send_log_topic='Load Balancing - Image' if static else 'Load Balancing',
+                session_id=session.session_id)
+        except Exception as e:
+            print(f"{ERROR} Client {client_id} lost while processing [{frame_key}]: {e}")
+            drop_client(client_id, client, session, (image, frame_key))
+            return
+
+        # Save the response
+        append_response(session, processed_data, client_id)
+
+    except Exception as e:
+        print(f"{ERROR} Client {client_id} failed to process task: {e}")
+
+    finally:
+        with lock:
+            session.in_flight -= 1
+            # Mark client as free again (unless it was dropped, the slot may have a new client):
+            if clients[client_id] is client:
+                client['is_free'] = True
+            work_ready.notify_all()
+
+
+def drop_client(client_id: str, client: dict, session: Session, task: tuple):
+    """The client is gone (send / receive failed): frees its slot for a reconnect and
+    requeues the task, its static images not sent yet go to the other ready clients."""
+    client['socket'].close()
+    l.create_log(topic='Connection', status='Error', client_id=client_id,
+                 message=f"Client {client_id} - `{client['name']}` lost, its slot is free again.")
+
+    with lock:
+        if clients[client_id] is client:
+            clients[client_id] = None
+
+        if session.processing_mode == 'static':
+            session.pinned.setdefault(client_id, deque()).appendleft(task)
+        else:
+            session.tasks.appendleft(task)
+
+        # The other clients are told the moved images as a new static batch (see bind_client),
+        # with no client ready they wait for the one reconnecting in this slot:
+        ready = get_ready_clients()
+        for other in sessions.values():
+            orphans = other.pinned.pop(client_id, None)
+            if not orphans:
+                continue
+            if ready:
+                target = min(ready, key=lambda cid: len(other.pinned.get(cid, ())))
+                other.pinned.setdefault(target, deque()).extend(orphans)
+            else:
+                other.pinned[client_id] = orphans
+
+        set_queue_depth()
+        work_ready.notify_all()
+
+
+def send_done(client_id: str):
+    """Send 'Done' message to the client (ends its dynamic loop)"""
+    handle_send(*send_message(clients[client_id]['socket'], topic='Dynamic Task', message="Done"),
+                log_topic='Load Balancing', log_client_id=client_id,
+                log_success_message='All tasks processed successfully.')
+
+
+def send_session_settings(client_id: str, processing_mode: str, profile: str):
+    """Send: Inform the client the mode of operation and the recognition profile."""
+    client_socket = clients[client_id]['socket']
 
-    # S1 - Send the image count to the client:
     handle_send(*send_message(
-        client_socket, topic='Static Images Count', message=len(image_list)),
-        log_topic='Load Balancing', log_client_id=client_id,
-        log_success_message='Image count sent successfully.')
+        client_socket, topic='Load Balancing', message=processing_mode),
+        log_topic='Load Balancing - Mode', log_client_id=client_id,
+        log_success_message='Load balancing mode sent successfully.')
 
-    # Send the images and timestamps to get response:
-    for i, (image, timestamp) in enumerate(zip(image_list, timestamp_list)):
-        # S2 - Send the timestamp:
-        handle_send(*send_message(
-            client_socket, topic='Static Image',
-            message=timestamp, file_path=image),
-            log_topic='Load Balancing - Image', log_client_id=client_id,
-            log_success_message=f'Image {i} - [{timestamp}] sent successfully.')
+    handle_send(*send_message(
+        client_socket, topic='Recognition Profile', message=profile),
+        log_topic='Load Balancing - Profile', log_client_id=client_id,
+        log_success_message=f'Recognition profile `{profile}` sent successfully.')
 
-        print(f"{INFO} Client {client_id} : Image {(i+1):02d} - [{timestamp}] sent.")
 
-        # R1 - Receive the processed data from the client:
-        resp = handle_recv(
-            *receive_message(client_socket), expected_topic='Processed Data',
-            log_topic='Load Balancing - Processed Data', log_client_id=client_id,
-            log_success_message=f'Image {i} - [{timestamp}] processed successfully.')
+def cancel(session_id: str = None):
+    """Stops sending the remaining frames of the session (frames already sent are still
+    received), the register is not saved. The static frames of the clients already told
+    their image count are still sent (they expect all the announced images), the other
+    clients' shares are dropped."""
+    session = get_session(session_id)
+    if session is None:
+        return
+    session.cancel_event.set()
 
-        # Save the response:
-        processed_data = json.loads(resp['message'])
-        append_response(processed_data)
+    with lock:
+        # Static shares of the clients not told their count yet:
+        untold = [client_id for client_id in session.pinned
+                  if not is_static_bound(client_id, session)]
+        dropped = len(session.tasks) + sum(len(session.pinned[client_id]) for client_id in untold)
+        if dropped:
+            print(f"{WARN} Session {session.session_id} cancelled, dropping {dropped} queued frames.")
+        session.tasks.clear()
+        for client_id in untold:
+            del session.pinned[client_id]
+        set_queue_depth()
+        work_ready.notify_all()
 
-    print(f"{INFO} Client {client_id} : All Image Processing completed.")
 
+# ------------------------------------------------------------------------------
+# Static Load Balancing Functions:
+# ------------------------------------------------------------------------------
+
+
+def get_ready_clients() -> list:
+    """Ids of the connected clients which completed their initialization (lock held)."""
+    return [client_id for client_id, client in clients.items()
+            if isinstance(client, dict) and client['warm_latency'] is not None]
+
+
+def is_static_bound(client_id: str, session: Session) -> bool:
+    """The client was told its static image count of the session (lock held)."""
+    client = clients.get(client_id)
+    return (isinstance(client, dict) and client['session'] == session.session_id
+            and client['mode'] == 'static' and client['static_left'] > 0)
 
-def static_mode(image_files, timestamps, frames_count):
+
+def static_mode(session: Session, image_files, frame_keys, frames_count):
     """Static load balancing strategy.
 
     Method:
-    - Divide the images equally among the clients.
-    - Run parallel threads for each client.
+    - Divide the images equally among the clients ready when the session starts.
+    - Each client's share is pinned to it (the scheduler sends them in order).
     - Each client processes the images in parallel (distributed processing).
     - Each client sends back the processed data to the server.
     """
     print(f"{INFO} Static mode selected. Starting static load balancing...")
-    per_client = frames_count // NO_OF_CLIENTS
-    print(f"{INFO} Dividing {frames_count} frames into {per_client} frames per client.")
-
-    divided_data = [
-        {
-            "images": image_files[i * per_client: i * per_client + per_client],
-            "timestamps": timestamps[i * per_client: i * per_client + per_client]
-        } for i in range(NO_OF_CLIENTS)]
-
-    # Code here for the part to split the images to process them in parallel
-    threads = []
-    for i in range(NO_OF_CLIENTS):
-        client_id = i + 1
-        thread = threading.Thread(
-            target=static_mode_thread,
-            args=(divided_data[i]['images'],
-                  divided_data[i]['timestamps'],
-                  client_id),
-            daemon=True
-        )
-        threads.append(thread)
-        thread.start()
 
-    # Wait for all threads to finish
-    for thread in threads:
-        thread.join()
+    # Shares are only pinned to the ready clients (a slot may never be taken):
+    with lock:
+        work_ready.wait_for(lambda: get_ready_clients() or session.cancel_event.is_set())
+        ready = get_ready_clients()
+    if not ready:
+        return
+
+    per_client, extra = divmod(frames_count, len(ready))
+    print(f"{INFO} Dividing {frames_count} frames into {per_client} frames per client "
+          f"({len(ready)} clients ready).")
+
+    start = 0
+    for i, client_id in enumerate(ready):
+        end = start + per_client + (1 if i < extra else 0)
+        if end > start:
+            add_tasks(session, list(zip(image_files[start:end], frame_keys[start:end])),
+                      client_id=client_id)
+        start = end
+
+    # Wait for all the clients to finish their share
+    wait_for_session(session)
 
     print(f"{INFO} Static load balancing completed.")
 
@@ -317,289 +864,440 @@ def static_mode(image_files, timestamps, frames_count):
 # ------------------------------------------------------------------------------
 
 
-def dynamic_mode_thread(image, timestamp, client_id):
-    client_socket = clients[client_id]['socket']
-    clients[client_id]['is_free'] = False  # Mark client as busy
-    completed_tasks = clients[client_id]['task_count']
+def order_for_early_stop(session: Session, tasks: list) -> list:
+    """Orders the tasks to resolve the undecided students as early as possible.
 
-    try:
-        # Send the task to the client
-        handle_send(*send_message(
-            client_socket, topic='Dynamic Task', message=timestamp, file_path=image),
-            log_topic='Load Balancing', log_client_id=client_id,
-            log_success_message=f"Task [{timestamp}] sent successfully.")
-        print(f"{INFO} Client {client_id} : Task {completed_tasks:02d} - [{timestamp}] sent.")
+    - Frames with duplicates count for more frames, so they go first.
+    - Otherwise coarse to fine over the timeline (bit-reversed index order),
+      so the frames processed so far are always spread over the whole class.
 
-        # Wait for the client to process the task and respond
-        resp = handle_recv(
-            *receive_message(client_socket), expected_topic='Processed Data',
-            log_topic='Load Balancing - Processed Data', log_client_id=client_id,
-            log_success_message=f"Task [{timestamp}] processed successfully.")
+    The order is static (computed once, not from the live register): a status only
+    depends on how many frames a student is seen in, and who is in a frame is not
+    known before it is processed. The register is used by drop_decided_tasks instead.
+    """
+    count = len(tasks)
+    bits = max(count - 1, 1).bit_length()
 
-        # Save the response
-        processed_data = json.loads(resp['message'])
-        append_response(processed_data)
+    def spread_rank(index):
+        return int(format(index, f'0{bits}b')[::-1], 2)
 
-    except Exception as e:
-        print(f"[ERROR] Client {client_id} failed to process task: {e}")
+    order = sorted(
+        range(count),
+        key=lambda i: (-session.live_register.frame_weight(tasks[i][1]), spread_rank(i)))
+    return [tasks[i] for i in order]
 
-    finally:
-        clients[client_id]['is_free'] = True  # Mark client as free again
+
+def drop_decided_tasks(session: Session):
+    """Once every student's status is decided, keep only the frames needed
+    for First_In / Last_In (or none, if boundaries are not to be kept). (lock held)"""
+    if not session.tasks or not session.live_register.all_decided():
+        return
+
+    if EARLY_STOP_KEEP_BOUNDARIES:
+        needed = set(session.live_register.needed_for_boundaries([key for _, key in session.tasks]))
+    else:
+        needed = set()
+
+    remaining = [task for task in session.tasks if task[1] in needed]
+    if len(remaining) < len(session.tasks):
+        skipped = len(session.tasks) - len(remaining)
+        msg = f"Session {session.session_id}: all students decided, skipping {skipped} of {session.total_tasks} frames."
+        print(f"{INFO} {msg}")
+        l.create_log(topic='Load Balancing - Early Stop', status='Info',
+                     client_id=-1, message=msg)
+        session.tasks = deque(remaining)
 
 
-def dynamic_mode(image_files, timestamps, frames_count):
+def dynamic_mode(session: Session, image_files, frame_keys, frames_count):
     """Dynamic load balancing strategy.
 
     Method:
-    - All the images are stored in task_queue.
+    - All the images are queued as the session's tasks.
     - Send the images to the clients one by one.
     - The client which is free processes the image.
     - The client sends back the processed data to the server.
     """
-
-    task_queue = list(zip(image_files, timestamps))
-    total_tasks = len(task_queue)
+    tasks = list(zip(image_files, frame_keys))
 
     print(f"{INFO} Dynamic mode selected. Starting dynamic load balancing...")
 
-    while len(task_queue) > 0:
-        for client_id, client in clients.items():
-            if client['is_free'] and len(task_queue) > 0:
-                # Assign the next task to the free client
-                image, timestamp = task_queue.pop(0)
-                client['task_count'] += 1
-                thread = threading.Thread(
-                    target=dynamic_mode_thread,
-                    args=(image, timestamp, client_id),
-                    daemon=True
-                )
-                thread.start()
-
-        # The thread in the end marks the client as free again
-        # So we do not need the thread.join() here
-
-        # Adding a small delay to avoid busy-waiting
-        threading.Event().wait(0.1)
-
-    # Wait for all (ongoing) threads to finish
-    wait = True
-    while wait:
-        wait = False
-        for client_id, client in clients.items():
-            if not client['is_free']:
-                wait = True
-                print(f"{WARN} Client {client_id} is still processing a task. Waiting...")
-                threading.Event().wait(1)
-
-    # Send 'Done' message to all clients
-    for client_id, client in clients.items():
-        client_socket = client['socket']
+    if EARLY_STOP:
+        session.early_stop = True
+        tasks = order_for_early_stop(session, tasks)
 
-        handle_send(*send_message(client_socket, topic='Dynamic Task', message="Done"),
-                    log_topic='Load Balancing', log_client_id=client_id,
-                    log_success_message='All tasks processed successfully.')
+    add_tasks(session, tasks)
+    wait_for_session(session)
 
     print(f"{INFO} All tasks processed successfully.")
 
 
+# ------------------------------------------------------------------------------
+# Adaptive (coarse to fine) Sampling Functions:
+# ------------------------------------------------------------------------------
+
+
+def get_coarse_indices(frames_count: int, step: int) -> list:
+    """Evenly spaced indices, always including the first and the last frame."""
+    if frames_count == 0:
+        return []
+    indices = list(range(0, frames_count, max(step, 1)))
+    if indices[-1] != frames_count - 1:
+        indices.append(frames_count - 1)
+    return indices
+
+
+def get_refine_indices(live_register: LiveRegister, frame_keys: list, attempted: set) -> tuple:
+    """Looks at the neighbouring processed samples (in time order).
+
+    Returns:
+        tuple: (indices to process next, gaps to interpolate)
+        - Midpoint of every gap where any student's presence changes (bisection),
+          the untried frame nearest to it if the midpoint itself failed.
+        - Gaps (i, j) where nothing changes, these can be interpolated. Also the gaps
+          where presence changes but every frame inside already failed, and the frames
+          before the first / after the last processed frame (i or j is None then).
+    """
+    processed = [i for i, key in enumerate(frame_keys) if key in live_register.columns]
+    if not processed:
+        return [], []
+
+    refine, gaps = [], []
+    for i, j in zip(processed, processed[1:]):
+        if j - i <= 1:
+            continue
+        vector_i = live_register.columns[frame_keys[i]]
+        vector_j = live_register.columns[frame_keys[j]]
+
+        if not (vector_i != vector_j).any():
+            gaps.append((i, j))
+            continue
+
+        middle = (i + j) // 2
+        untried = [index for index in range(i + 1, j) if index not in attempted]
+        if untried:
+            refine.append(min(untried, key=lambda index: abs(index - middle)))
+        else:
+            gaps.append((i, j))
+
+    # First / last frames failed (coarse round always has them), nearest processed frame's result:
+    if processed[0] > 0:
+        gaps.append((None, processed[0]))
+    if processed[-1] < len(frame_keys) - 1:
+        gaps.append((processed[-1], None))
+    return refine, gaps
+
+
+def interpolate_gaps(session: Session, frame_keys: list, gaps: list):
+    """Frames inside a gap get the result of its nearest end point (both ends are the same in a stable gap)."""
+    reg_nos = session.live_register.reg_nos
+    columns = session.live_register.columns
+
+    for i, j in gaps:
+        start = 0 if i is None else i + 1
+        end = len(frame_keys) if j is None else j
+        for index in range(start, end):
+            if frame_keys[index] in columns:
+                continue
+            nearest = i if j is None or (i is not None and index - i <= j - index) else j
+            vector = columns[frame_keys[nearest]]
+
+            append_response(session, {
+                'frame_key': frame_keys[index],
+                'people_present': [reg_nos[row] for row in vector.nonzero()[0].tolist()],
+                'interpolated': True,
+                # Same shape as the clients' results, nothing was processed:
+                'time_records': {
+                    'task_start_time': None,
+                    'task_end_time': None,
+                    'task_time_taken': 0.0,
+                    'stages_ns': {},
+                },
+            })
+
+
+def adaptive_mode(session: Session, image_files, frame_keys, frames_count):
+    """Adaptive (coarse to fine) sampling strategy.
+
+    Method:
+    - Process an evenly spaced coarse subset of the frames first.
+    - Wherever a student's presence changes between neighbouring samples,
+      process the frame in the middle (recursively, so First_In / Last_In
+      boundaries are found by bisection).
+    - Stretches where nothing changes are filled in by interpolation, also the
+      frames around failed samples once nothing is left to try there.
+    - Tasks are sent to the clients the same way as in dynamic mode.
+    """
+    print(f"{INFO} Adaptive mode selected. Starting coarse to fine sampling...")
+
+    tasks = sorted(zip(frame_keys, image_files))
+    frame_keys = [key for key, _ in tasks]
+    image_files = [image for _, image in tasks]
+
+    batch = get_coarse_indices(len(tasks), ADAPTIVE_COARSE_STEP)
+    attempted = set(batch)
+    gaps = []
+    processed_count = 0
+    rounds = 0
+
+    while batch and not session.cancel_event.is_set():
+        rounds += 1
+        print(f"{INFO} Adaptive round {rounds} : {len(batch)} frames.")
+        add_tasks(session, [(image_files[i], frame_keys[i]) for i in batch])
+        wait_for_session(session)
+        processed_count += len(batch)
+
+        # A frame which failed once is not sent again (the next untried one in its gap is):
+        batch, gaps = get_refine_indices(session.live_register, frame_keys, attempted)
+        attempted.update(batch)
+
+    if not session.cancel_event.is_set():
+        interpolate_gaps(session, frame_keys, gaps)
+
+    msg = f"Processed {processed_count} of {len(tasks)} frames in {rounds} rounds, rest interpolated."
+    print(f"{INFO} {msg}")
+    l.create_log(topic='Load Balancing - Adaptive', status='Info',
+                 client_id=-1, message=msg)
+
+
 # ------------------------------------------------------------------------------
 # Load Balancing Manager:
 # ------------------------------------------------------------------------------
 
-def start_load_balancing():
+PROCESSING_MODES = session_store.PROCESSING_MODES
+
+
+def start_load_balancing(session_id: str = None, priority: int = 1) -> Session:
     """Start the load balancing strategy. To handle the attendance calculation."""
     print(f"{INFO} Starting the load balancing strategy...")
 
-    # Read the uploaded_data json file:
-    with open(UPLOADED_DATA, 'r') as f:
-        data = json.load(f)
+    # Read the uploaded session (latest one if not given):
+    data = load_session(session_id)
 
-    image_files = data['files']
-    timestamps = data['js_mod']
-    frames_count = data['frame_count']
     processing_mode = data['processing_mode']
+    if processing_mode.lower() not in PROCESSING_MODES:
+        msg = f"[ERROR] Invalid processing mode: {processing_mode}."
+        msg += "Please select either 'static', 'dynamic' or 'adaptive'."
+        l.create_log(topic='Load Balancing - Mode',
+                     status='Error', client_id=-1, message=msg)
+        raise ValueError(msg)
 
-    # Log the mode of operation:
-    l.create_log(client_id=-1, topic='Load Balancing - Mode',
-                 message=processing_mode, status='Info')
+    duplicates = {duplicate for duplicate, _ in data.get('duplicates', [])}
 
-    # Send: Inform clients the mode of operation:
-    for i in range(NO_OF_CLIENTS):
-        client_id = str(i + 1)
-        client_socket = clients[client_id]['socket']
+    # Only the representative frames are sent to clients,
+    # duplicates get the same result copied by the live register:
+    image_files, frame_keys = [], []
+    for image, frame_key in zip(data['files'], data['keys']):
+        if frame_key not in duplicates:
+            image_files.append(image)
+            frame_keys.append(frame_key)
+    frames_count = len(image_files)
 
-        handle_send(*send_message(
-            client_socket, topic='Load Balancing', message=processing_mode),
-            log_topic='Load Balancing - Mode', log_client_id=client_id,
-            log_success_message='Load balancing mode sent successfully.')
+    if duplicates:
+        print(f"{INFO} Skipping {len(duplicates)} duplicate frames out of {data['frame_count']}.")
+
+    # Results are compiled as they arrive (the profile is sent to the clients with the first task):
+    session = start_session(
+        data['session_id'], len(data['keys']), processing_mode,
+        data.get('recognition_profile'), priority, data.get('duplicates', []))
 
     # Start the load balancing strategy
-    if processing_mode.lower() == 'static':
-        static_mode(image_files, timestamps, frames_count)
+    try:
+        if session.processing_mode == 'static':
+            if EARLY_STOP:
+                print(f"{WARN} Early stop is only supported in dynamic mode, processing all frames.")
+            static_mode(session, image_files, frame_keys, frames_count)
 
-    elif processing_mode.lower() == 'dynamic':
-        dynamic_mode(image_files, timestamps, frames_count)
+        elif session.processing_mode in ('dynamic', 'pipeline'):
+            dynamic_mode(session, image_files, frame_keys, frames_count)
 
-    else:
-        msg = f"[ERROR] Invalid processing mode: {processing_mode}."
-        msg += "Please select either 'static' or 'dynamic'."
-        l.create_log(topic='Load Balancing - Mode',
-                     status='Error', client_id=-1, message=msg)
-        raise ValueError(msg)
+        else:
+            adaptive_mode(session, image_files, frame_keys, frames_count)
+    finally:
+        end_session(session)
+    return session
+
+
+def get_known_profiles() -> set | None:
+    """Recognition profiles every ready client knows, None if no client is ready yet."""
+    known = None
+    for client in clients.values():
+        if isinstance(client, dict) and client['warm_latency'] is not None:
+            profiles = set(client['profiles'])
+            known = profiles if known is None else known & profiles
+    return known
 
 
+def get_profile(name: str = None) -> str:
+    """Recognition profile to use (the default one if not given / unknown to the clients).
+    Before any client is ready the name is kept, a client falls back to its default itself."""
+    profile = name or DEFAULT_PROFILE
+    known = get_known_profiles()
+    if known is not None and profile not in known:
+        print(f"{WARN} Unknown recognition profile `{profile}`, using `{DEFAULT_PROFILE}`.")
+        profile = DEFAULT_PROFILE
+    return profile
+
+
+# ------------------------------------------------------------------------------
+# Pipeline mode (frames are dispatched while the upload is still going on):
 # ------------------------------------------------------------------------------
-# (Post processing) Compile the results and save the attendance:
+# image_processor.save_frames() hands every saved frame to submit_frame(),
+# which queues it as a task of the session, so the scheduler sends it to
+# whichever client is free (same as the dynamic mode).
 # ------------------------------------------------------------------------------
 
 
-def get_datetime(js_mod_dt):
-    """Returns the timestamp (in Python-datetime format) and the frame-number from the js_mod_dt string
+def start_pipeline(session_id: str, expected_frames: int, profile: str = None,
+                   priority: int = 1) -> Session:
+    """Starts processing the session before its frames are uploaded."""
+    print(f"{INFO} Pipeline mode selected. Frames are processed as they are uploaded...")
 
-    ip = "8/8/2024, 12:56:36 am, 0"
-    op = datetime(2024, 8, 8, 0, 56, 36) and 0
-    """
-    number = js_mod_dt.split(",")[-1].strip()
-    stamp = ', '.join(js_mod_dt.split(",")[:-1])
-    dt_timestamp = datetime.strptime(stamp, "%d/%m/%Y, %I:%M:%S %p")
-    return dt_timestamp, int(number)
-
-
-def compare_timestamps(ts1: str, ts2: str,
-                       comparison: Literal['earlier', 'later']) -> str:
-    """Compare two timestamps and return the older/newer one."""
-
-    # If any of the timestamps is not init, return the other one:
-    if ts1 == -1:
-        return ts2
-    if ts2 == -1:
-        return ts1
-
-    dt1, frame1 = get_datetime(ts1)
-    dt2, frame2 = get_datetime(ts2)
-
-    if comparison == 'earlier':
-        # if ts1 came earlier than ts2 (so far),
-        #   or
-        # (if the ts1 n ts2 are same [and] the frame1 is smaller than frame2)
-        if (dt1 < dt2) or (dt1 == dt2 and frame1 < frame2):
-            return ts1
-        else:
-            return ts2
-
-    elif comparison == 'later':
-        # if ts1 came later than ts2 (so far),
-        #   or
-        # (if the ts1 n ts2 are same [and] the frame1 is larger than frame2)
-        if (dt1 > dt2) or (dt1 == dt2 and frame1 > frame2):
-            return ts1
-        else:
-            return ts2
+    session = start_session(session_id, expected_frames, 'pipeline', profile, priority,
+                            streaming=True)
+    session.pipeline_thread = threading.Thread(target=run_pipeline, args=(session,), daemon=True)
+    session.pipeline_thread.start()
+    return session
 
 
-def update_register(register: dict, present: list, timestamp: str):
-    """ Updates the register with the present people and their attendance status
+def submit_frame(session_id: str, file_path: str, frame_key: int, representative: int):
+    """A frame of the session is saved (on_frame callback of image_processor.save_frames).
+    Duplicates are not sent, they get the representative's result."""
+    session = get_session(session_id)
+    session.pipeline_frames += 1
 
-    Args:
-        present (list): List of registration numbers of present students.
-        timestamp (str): Timestamp of the image.
-    """
-    for reg_no in register.keys():
-        # If the student is not present, mark the attendance as False
-        if reg_no not in present:
-            register[reg_no]['Attendance'][timestamp] = False
+    if representative != frame_key:
+        session.live_register.add_duplicate(frame_key, representative)
+        return
 
-        else:
-            # If the student is present, mark the attendance as True
-            # and update the first and last in timestamps
+    # Cancelled, the rest of the upload is only drained:
+    if session.cancel_event.is_set():
+        return
+    add_tasks(session, [(file_path, frame_key)])
 
-            register[reg_no]['Attendance'][timestamp] = True
 
-            register[reg_no]['First_In'] = compare_timestamps(
-                register[reg_no]['First_In'], timestamp, 'earlier')
+def finish_pipeline(session_id: str):
+    """Upload is over (or failed), no more frames are coming."""
+    session = get_session(session_id)
+    session.live_register.close(session.pipeline_frames)
+    session.closed.set()
 
-            register[reg_no]['Last_In'] = compare_timestamps(
-                register[reg_no]['Last_In'], timestamp, 'later')
 
+def wait_pipeline(session_id: str) -> bool:
+    """Waits for the session's pipeline to process all its frames, False if none is running."""
+    session = get_session(session_id)
+    if session is None or session.pipeline_thread is None:
+        return False
+    session.pipeline_thread.join()
+    session.pipeline_thread = None
+    return True
 
-def mark_attendance(register: dict, debug: bool = False):
-    """Marks the attendance of each student in the register (75% criteria)"""
 
-    if debug:
-        print(f'\n[Attendance Info]: Marking attendance...')
-        print(f'    | {"Reg".center(10)} | {"Name".center(15)} | {"Present".center(10)} | {"Absent".center(10)} | {"Percentage".center(10)} | {"Status".center(10)} |')
-
-    for stud in register.values():
-        present = 0
-        absent = 0
-
-        # iterate over all the time-stamps:
-        for stamp in stud['Attendance'].keys():
-            # print(stud['Attendance'][stamp])
-            if (stud['Attendance'][stamp]):
-                present += 1
-            else:
-                absent += 1
+def run_pipeline(session: Session):
+    session.closed.wait()
+    wait_for_session(session)
+    end_session(session)
+    print(f"{INFO} All pipeline tasks of {session.session_id} processed successfully.")
 
-        if (present + absent) == 0:
-            percentage = 0
-        else:
-            percentage = round((present / (present + absent)) * 100)
-        stud['Percentage'] = percentage
-        status = 'Present' if percentage >= 75 else 'Absent'
-        stud['Status'] = status
+    # Register is saved as soon as the last frame lands, this only
+    # saves it if some frames could not be processed:
+    finish_live_register(session)
+    save_stage_summary(session, debug=True)
+
+
+# ------------------------------------------------------------------------------
+# (Streaming) Compile the results and save the attendance:
+# ------------------------------------------------------------------------------
 
-        if debug:
-            t_reg = str(stud['Reg_No']).center(10)
-            t_name = str(stud['Name'][:15]).center(15)
 
-            print(
-                f'    | {t_reg} | {t_name} | {str(present).center(10)} | {str(absent).center(10)} | {str(percentage).center(10)} | {status.center(10)} |')
-            # print(f'[Attendance Info]: Present: {present}, Absent: {absent}')
-            # print(f'[Attendance Info]: Status: {status}, Percentage: {percentage}')
+def load_class_register() -> list:
+    with open(CLASS_REGISTER, 'r') as file:
+        return json.load(file)
 
 
-def save_register(register: dict):
-    """Saves the register to the file"""
-    with open(ATTENDANCE_REGISTER, "w") as f:
-        json.dump(register, f, indent=4)
+def load_session(session_id: str = None) -> dict:
+    """Uploaded data of the session (latest uploaded session if not given)."""
+    if session_id is None:
+        session_id = session_store.get_latest_session_id()
 
+    data = session_store.get_upload_data(session_id) if session_id else None
+    if data is None:
+        msg = f"[ERROR] No uploaded session found: {session_id}."
+        l.create_log(topic='Load Balancing - Session',
+                     status='Error', client_id=-1, message=msg)
+        raise ValueError(msg)
+    return data
 
-def compile_results(debug: bool = False):
-    """Fn to compile individual responses of all the images and save the attendance."""
 
-    # load the register from the file:
-    with open(CLASS_REGISTER, 'r') as file:
-        stud_info_list = json.load(file)
-
-    register = {}
-    for stud in stud_info_list:
-        register[stud['Reg_No']] = {
-            'Name': stud['Name'],
-            'Reg_No': stud['Reg_No'],
-            "Disp_name": stud['Disp_name'],
-            # "Image": stud['Image'],
-            # "Pickle": stud['Pickle'],
-
-            "First_In": -1,
-            "Last_In": -1,
-            "Attendance": {},
-            "Percentage": -1,
-            "Status": -1,
-        }
+def get_provisional(session_id: str = None) -> dict:
+    """Provisional attendance of the session (the latest started one if not given)."""
+    session = get_session(session_id)
+    if session is None:
+        return {'frames_done': 0, 'frames_total': 0, 'frames_remaining': 0,
+                'complete': False, 'undecided': 0, 'students': {}}
+    return session.live_register.get_provisional()
 
-    # Load the responses from the file:
-    with open(ATTENDANCE_LOG_FILE, 'r') as file:
-        responses = json.load(file)
 
-    # Compile the results from all the responses:
-    for response in responses:
-        present = response['people_present']
-        timestamp = response['timestamp']
-        update_register(register, present, timestamp)
+def get_progress(session_id: str = None) -> dict:
+    """Frames done (in total and per client) and the estimated time left of the session."""
+    session = get_session(session_id)
+    provisional = get_provisional(session_id)
+    done, remaining = provisional['frames_done'], provisional['frames_remaining']
 
-    mark_attendance(register, debug=debug)
-    save_register(register)
+    elapsed = time.time() - session.started_at if session is not None else 0.0
+    rate = done / elapsed if elapsed > 0 else 0.0
+    with lock:
+        per_client = dict(session.client_frames) if session is not None else {}
+        face_tracking = {cid: dict(c) for cid, c in session.tracking_stats.items()} if session is not None else {}
+        queued = session.queued() if session is not None else 0
+
+    return {
+        'session_id': session.session_id if session is not None else session_id,
+        'priority': session.priority if session is not None else None,
+        'frames_done': done,
+        'frames_total': provisional['frames_total'],
+        'frames_queued': queued,
+        'per_client': per_client,
+        'face_tracking': face_tracking,
+        'elapsed': round(elapsed, 2),
+        'eta': round(remaining / rate, 2) if rate > 0 else None,
+        'complete': provisional['complete'],
+    }
+
+
+def finish_live_register(session: Session, debug: bool = False):
+    """Saves the final register of the session (only once per session)."""
+    with lock:
+        if session.register_saved or session.cancel_event.is_set():
+            return
+        session.register_saved = True
+
+    # Pending results are committed first (same writer queue, same order):
+    register = session.live_register.to_register(debug=debug)
+    session_store.save_register(session.session_id, register)
+    tracing.save_trace()
+
+    # Keep the session in the (columnar) attendance history:
+    keys = list(session.live_register.columns)
+    attendance_archive.append_session(
+        session.session_id, register, frames_count=len(keys),
+        started_at=min(keys) if keys else -1)
+
+
+def compile_results(session_id: str = None, debug: bool = False):
+    """Fn to compile (offline) the responses saved in the session store and save the attendance.
+    Not needed in a normal run, the register is already compiled while the responses arrive."""
+    data = load_session(session_id)
+
+    session = start_session(
+        data['session_id'], len(data['keys']), data['processing_mode'],
+        data.get('recognition_profile'), duplicates=data.get('duplicates', []))
+
+    # Load the saved responses of the session:
+    for response in session_store.get_results(data['session_id']):
+        session.live_register.add_response(response)
+
+    end_session(session)
+    finish_live_register(session, debug=debug)
 
 
 # ------------------------------------------------------------------------------
@@ -607,7 +1305,7 @@ def compile_results(debug: bool = False):
 # ------------------------------------------------------------------------------
 
 
-def driver_function():
+def driver_function(session_id: str = None, priority: int = 1):
     """Main driver function to start load balancing strategies.
 
     This (parallel) Server has already been started from the main flask server
@@ -616,9 +1314,21 @@ def driver_function():
     This driver function will be called when images and jsons are ready 
     This fn will handle all the communication and processing in clients
     And will return the attendance json to the main flask server
+    Several sessions can be driven at the same time (from different threads),
+    they share the clients in proportion to their priority.
     """
-    start_load_balancing()
-    compile_results()
+    session_id = session_id or session_store.get_latest_session_id()
+
+    # Frames of a pipeline upload are already being processed:
+    if wait_pipeline(session_id):
+        return
+
+    session = start_load_balancing(session_id, priority)
+
+    # Register is saved as soon as the last frame lands,
+    # this only saves it if some frames could not be processed:
+    finish_live_register(session)
+    save_stage_summary(session, debug=True)
     
 
 
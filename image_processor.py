@@ -2,33 +2,274 @@ import os
 import json
 import time
 import base64
-from datetime import datetime
+import queue
+import hashlib
+import threading
+import calendar
+import startup
+import tracing
+import numpy as np
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 from typing import Union, List
 
 load_dotenv()
 # print(static_url)
 
+# cv2 is only needed for dedup hashes and server-side extraction, loaded on first use.
 
-def get_py_stamp(js_timestamp: str):
+# Duplicate / near-duplicate frame elimination:
+DEDUP_FRAMES = os.environ.get('dedup_frames', 'True') == 'True'
+# Near duplicates are opt-in (-1 = off): a hash of the whole classroom frame can stay the same
+# while a student enters or leaves, so a near duplicate may have a different attendance.
+DEDUP_MAX_DISTANCE = int(os.environ.get('dedup_max_distance', -1))
+DEDUP_HASH_SIZE = 16
+
+
+JS_TIMESTAMP_FORMAT = "%d/%m/%Y, %I:%M:%S %p"
+
+
+def get_frame_key(dt_timestamp: datetime, ordinal: int = 0) -> int:
+    """
+    Canonical integer key of a frame: epoch milliseconds + frame ordinal (within that second)
+
+    The browser timestamps are wall-clock times of the class, so they are treated as UTC
+    to keep the conversion independent of the server's timezone.
+
+    ip = datetime(2024, 8, 8, 0, 56, 36), 2
+    op = 1723078596002
+    """
+    return calendar.timegm(dt_timestamp.timetuple()) * 1000 + ordinal
+
+
+def get_key_datetime(frame_key: int) -> datetime:
+    """(Naive) wall-clock datetime of the frame key, ordinal is dropped."""
+    return datetime.fromtimestamp(frame_key // 1000, tz=timezone.utc).replace(tzinfo=None)
+
+
+def format_frame_key(frame_key: int, fmt: str = JS_TIMESTAMP_FORMAT) -> str:
+    """Display string of the frame key (only to be used while rendering)."""
+    return get_key_datetime(frame_key).strftime(fmt)
+
+
+def get_dhash(image_data: bytes, hash_size: int = DEDUP_HASH_SIZE) -> int:
+    """
+    Perceptual (difference) hash of an encoded image.
+    Near identical frames give hashes with small hamming distance.
+    Returns -1 if the image can not be decoded.
+    """
+    cv2 = startup.lazy_import('cv2')
+    buffer = np.frombuffer(image_data, dtype=np.uint8)
+    image = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    if image is None:
+        return -1
+
+    small = cv2.resize(image, (hash_size + 1, hash_size),
+                       interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int(''.join('1' if bit else '0' for bit in bits), 2)
+
+
+def hamming_distance(hash_1: int, hash_2: int) -> int:
+    return bin(hash_1 ^ hash_2).count('1')
+
+
+def process_image(timestamps: Union[list, str], base64s: Union[list, str], folder_name: str = None):
     """
-    Convert js timestamp to py timestamp
+    Takes js timestamps and base64s (data urls: "data:image/jpeg;base64,full_base64_string")
+    Decodes them one by one and saves them, see save_frames()
     """
-    dt_timestamp = datetime.strptime(js_timestamp, "%d/%m/%Y, %I:%M:%S %p")
-    py_timestamp = dt_timestamp.strftime("%Y-%m-%d_%Hh%Mm%Ss")
-    return py_timestamp
+    def decode(timestamp, base64_str):
+        # get the extension from: "data:image/jpeg;base64,full_base64_string"
+        extension = base64_str.split(',')[0].split('/')[1].split(';')[0]
+        # remove that part: "data:image/jpeg;base64"
+        return timestamp, extension, base64.b64decode(base64_str.split(',')[1])
+
+    return save_frames((decode(timestamp, base64_str)
+                        for timestamp, base64_str in zip(timestamps, base64s)), folder_name=folder_name)
+
 
+# ------------------------------------------------------------------------------
+# Binary frame stream (streaming upload):
+# ------------------------------------------------------------------------------
+# Same framing as the socket protocol (4 byte big endian size prefix), per frame:
+#   [header size][header json: {"timestamp": js timestamp, "type": "image/jpeg"}]
+#   [image size][image bytes]
+# ------------------------------------------------------------------------------
 
-def process_image(timestamps: Union[list, str], base64s: Union[list, str]):
+MAX_FRAME_HEADER = 64 * 1024
+MAX_FRAME_SIZE = 32 * 1024 * 1024
+
+
+def read_exactly(stream, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise ValueError("Frame stream ended in the middle of a frame.")
+        data += chunk
+    return bytes(data)
+
+
+def read_frame_stream(stream):
     """
-    Takes js timestamps and base64s
+    Yields (js timestamp, extension, image bytes) of every frame in the stream,
+    only one frame is held in memory at a time.
+    """
+    while True:
+        size_bytes = stream.read(4)
+        if not size_bytes:
+            return
+        if len(size_bytes) < 4:
+            size_bytes += read_exactly(stream, 4 - len(size_bytes))
+
+        header_size = int.from_bytes(size_bytes, "big")
+        if not 0 < header_size <= MAX_FRAME_HEADER:
+            raise ValueError(f"Invalid frame header size: {header_size}")
+        header = json.loads(read_exactly(stream, header_size).decode("utf-8"))
+        timestamp = header.get("timestamp") if isinstance(header, dict) else None
+        if not isinstance(timestamp, str):
+            raise ValueError(f"Frame header without a valid timestamp: {header}")
+        # Checked here, so a bad frame fails the upload before it is saved:
+        datetime.strptime(timestamp, JS_TIMESTAMP_FORMAT)
+
+        image_size = int.from_bytes(read_exactly(stream, 4), "big")
+        if not 0 < image_size <= MAX_FRAME_SIZE:
+            raise ValueError(f"Invalid frame size: {image_size}")
+
+        extension = header.get("type", "image/jpeg").split('/')[-1]
+        yield timestamp, extension, read_exactly(stream, image_size)
+
+
+# ------------------------------------------------------------------------------
+# Server side frame extraction (recorded video upload):
+# ------------------------------------------------------------------------------
+
+EXTRACT_QUEUE_SIZE = 8
+EXTRACT_JPEG_QUALITY = 95
+
+
+def get_video_duration(video_path: str) -> float:
+    """Duration (ms) from the container, 0 if it is not known (browser webm recordings)."""
+    cv2 = startup.lazy_import('cv2')
+    capture = cv2.VideoCapture(video_path)
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        if fps > 0 and 0 < count < 1e9:
+            return count / fps * 1000
+        return 0.0
+    finally:
+        capture.release()
+
+
+def extract_frames(video_path: str, frame_count: int, start_timestamp: str, duration_ms: float):
+    """
+    Yields (js timestamp, extension, jpeg bytes) of `frame_count` evenly spaced frames,
+    same as the browser used to extract (frame i at i * duration / frame_count).
+
+    A producer thread decodes the frames into a bounded queue, so the extraction
+    runs while the consumer saves / dispatches the previous frames.
+
+    Browser recordings (webm) have no seek index, so instead of seeking, the frames
+    are grabbed (not decoded) in order and only the wanted ones are decoded.
+    Missing frames at the end (recording shorter than the duration) repeat the last one.
+    """
+    cv2 = startup.lazy_import('cv2')
+    start = datetime.strptime(start_timestamp, JS_TIMESTAMP_FORMAT)
+    interval = duration_ms / frame_count
+    frames = queue.Queue(maxsize=EXTRACT_QUEUE_SIZE)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        capture = cv2.VideoCapture(video_path)
+        last = None
+        position = None    # time of the last grabbed frame
+        decoded = False    # the last grabbed frame is already in `last`
+        ended = False
+        try:
+            for i in range(frame_count):
+                wanted = i * interval
+
+                # Skip (grab only) the frames before the wanted time, the current frame
+                # is reused when it already is at (or past) the wanted time:
+                while not ended and (position is None or position < wanted):
+                    if capture.isOpened() and capture.grab():
+                        position = capture.get(cv2.CAP_PROP_POS_MSEC)
+                        decoded = False
+                    else:
+                        ended = True
+
+                if not ended and not decoded:
+                    decoded = True
+                    ok, image = capture.retrieve()
+                    if ok:
+                        ok, buffer = cv2.imencode(
+                            '.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, EXTRACT_JPEG_QUALITY])
+                    if ok:
+                        last = buffer.tobytes()
+                if last is None:
+                    raise ValueError("No frame could be read from the video.")
+
+                timestamp = (start + timedelta(milliseconds=wanted)).strftime(JS_TIMESTAMP_FORMAT)
+                if not put((timestamp, 'jpeg', last)):
+                    return
+            put(None)
+        except Exception as e:
+            put(e)
+        finally:
+            capture.release()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise ValueError(f"Frame extraction failed: {item}")
+            yield item
+    finally:
+        # Consumer stopped early (error / closed), let the producer exit:
+        stop.set()
+        producer.join(timeout=2)
+
+
+def save_frames(frames, on_frame=None, folder_name: str = None):
+    """
+    Takes (js timestamp, extension, image bytes) of the frames (any iterable, consumed one by one)
+    Frames go to upload_folder/<folder_name> (the session id, so concurrent uploads never share
+    a folder), the upload time if not given.
+    on_frame(file path, frame key, representative frame key) is called as soon as each frame
+    is saved (pipeline mode), the representative is the frame key itself unless it is a duplicate.
     Converts into py stamps, and also, saves the images
-    Returns modified js stamps with _1, _2 etc. as well
+    Returns the canonical integer frame keys (epoch ms + frame ordinal) as well
+
+    Also returns the duplicates list [[duplicate frame key, representative frame key], ...]
+    Exact duplicates (same content hash) are not saved again, they point to the representative file.
+    Near duplicates (dhash distance <= DEDUP_MAX_DISTANCE from the last representative, only if
+    DEDUP_MAX_DISTANCE >= 0) are saved, but only the representative frames need to be sent to the clients.
     """
     curr_stamp = datetime.now()
     py_time_stamps = []
-    js_modified_time_stamps = []
+    frame_keys = []
     file_names = []
+    duplicates = []
+
+    # content hash -> (frame key, file path) of the representative frame:
+    seen_hashes = {}
+    # dhash and frame key of the last representative frame:
+    last_dhash, last_representative = None, None
 
     # Issues is that, when multiple frames under same second are passed, out naming scheme does not support that
     # Means, the same name is returned by function and only one image is over-written again n again with that PARTICULAR name.
@@ -36,22 +277,16 @@ def process_image(timestamps: Union[list, str], base64s: Union[list, str]):
     last_saved = ""
     same_name_count = 0
 
-    # with open("formData.json", 'w') as f:
-    #     f.write(json.dumps({'timestamps': timestamps, 'bases': base64s}))
-
-    for timestamp, base64_str in zip(timestamps, base64s):
-
-        # get the extension from: "data:image/jpeg;base64,full_base64_string"
-        extension = base64_str.split(',')[0].split('/')[1].split(';')[0]
-        # remove that part: "data:image/jpeg;base64"
-        image_data = base64.b64decode(base64_str.split(',')[1])
-
-        upload_folder = os.environ.get("upload_folder")
-        folder = f'{curr_stamp.strftime("%Y-%m-%d_%Hh%Mm%Ss")}'
-        folder = os.path.join(upload_folder, folder)
-        os.makedirs(folder, exist_ok=True)
+    upload_folder = os.environ.get("upload_folder")
+    folder_name = folder_name or f'{curr_stamp.strftime("%Y-%m-%d_%Hh%Mm%Ss")}'
+    folder = os.path.join(upload_folder, folder_name)
+    os.makedirs(folder, exist_ok=True)
 
-        file_base_name = get_py_stamp(timestamp)
+    start_ns = time.time_ns()
+    for timestamp, extension, image_data in frames:
+        # The only place where the js timestamp string is parsed:
+        dt_timestamp = datetime.strptime(timestamp, JS_TIMESTAMP_FORMAT)
+        file_base_name = dt_timestamp.strftime("%Y-%m-%d_%Hh%Mm%Ss")
 
         if file_base_name == last_saved:
             same_name_count += 1
@@ -63,17 +298,51 @@ def process_image(timestamps: Union[list, str], base64s: Union[list, str]):
         # Irrespective of the above if-else, always append the count
         # Maintains same filename-length for all images
         file_base_name += f'_{same_name_count:02d}'
-        js_modified_time_stamps.append(f"{timestamp}, {same_name_count}")
+        frame_key = get_frame_key(dt_timestamp, same_name_count)
+        frame_keys.append(frame_key)
 
         file_name = f'{file_base_name}.{extension}'
         file_path = os.path.join(folder, file_name)
 
         py_time_stamps.append(file_base_name)
+        representative = frame_key
+
+        if DEDUP_FRAMES:
+            # Exact duplicate (ex. padded frames from the browser), no need to save it again:
+            content_hash = hashlib.sha1(image_data).hexdigest()
+            if content_hash in seen_hashes:
+                representative, representative_path = seen_hashes[content_hash]
+                duplicates.append([frame_key, representative])
+                file_names.append(representative_path)
+                tracing.record('skip duplicate', start_ns, time.time_ns(), 'upload',
+                               tracing.get_trace_id(folder_name, frame_key))
+                if on_frame is not None:
+                    on_frame(representative_path, frame_key, representative)
+                start_ns = time.time_ns()
+                continue
+
+            # Near duplicate of the last representative frame (static camera, opt-in):
+            dhash = get_dhash(image_data) if DEDUP_MAX_DISTANCE >= 0 else -1
+            if (dhash != -1 and last_dhash is not None and
+                    hamming_distance(dhash, last_dhash) <= DEDUP_MAX_DISTANCE):
+                representative = last_representative
+                duplicates.append([frame_key, representative])
+            else:
+                last_dhash, last_representative = dhash, frame_key
+
+            seen_hashes[content_hash] = (representative, file_path)
+
         file_names.append(file_path)
 
         with open(file_path, 'wb') as f:
             f.write(image_data)
 
+        tracing.record('save frame', start_ns, time.time_ns(), 'upload',
+                       tracing.get_trace_id(folder_name, frame_key))
+        if on_frame is not None:
+            on_frame(file_path, frame_key, representative)
+        start_ns = time.time_ns()
+
         # print(f'Saved image `{file_name}` successfully...')
-    return file_names, py_time_stamps, js_modified_time_stamps
+    return file_names, py_time_stamps, frame_keys, duplicates
 # process_image(timestamps, )
@@ -0,0 +1,137 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+import session_store
+import distributed_server
+
+
+# ------------------------------------------------------------------------------
+# Background attendance calculation jobs:
+# ------------------------------------------------------------------------------
+# /calc_attendance only submits a job and returns its id, the job runs
+# distributed_server.driver_function() on the executor below.
+# Up to MAX_SESSIONS jobs run at the same time (their frames are interleaved
+# over the shared clients by the distributed server), the others wait in the queue.
+#
+# Job status: queued -> running -> completed / failed / cancelled
+#             (cancelling: cancel was asked while running)
+# ------------------------------------------------------------------------------
+
+load_dotenv()
+
+FINISHED = ('completed', 'failed', 'cancelled')
+MAX_SESSIONS = int(os.environ.get('max_sessions', 4))
+
+# Finished jobs are dropped after JOB_TTL seconds, or the oldest ones past MAX_JOBS:
+JOB_TTL = float(os.environ.get('job_ttl', 3600))
+MAX_JOBS = int(os.environ.get('max_jobs', 500))
+
+executor = ThreadPoolExecutor(max_workers=MAX_SESSIONS, thread_name_prefix='attendance-job')
+
+jobs = {}
+jobs_lock = threading.Lock()
+
+
+def submit(session_id: str = None, priority: int = 1) -> dict:
+    """Queues the attendance calculation of the session (latest upload if not given)."""
+    job_id = uuid.uuid4().hex
+    job = {
+        'job_id': job_id,
+        'session_id': session_id or session_store.get_latest_session_id(),
+        'priority': priority,
+        'status': 'queued',
+        'created_at': time.time(),
+        'started_at': None,
+        'finished_at': None,
+        'error': None,
+        'progress': None,
+    }
+
+    with jobs_lock:
+        prune_jobs()
+        jobs[job_id] = job
+        job['future'] = executor.submit(run_job, job_id)
+    return get_job(job_id)
+
+
+def prune_jobs():
+    """Drops the finished jobs older than JOB_TTL, and the oldest ones past MAX_JOBS (lock held)."""
+    now = time.time()
+    finished = sorted((job['finished_at'], job_id) for job_id, job in jobs.items()
+                      if job['status'] in FINISHED)
+    excess = len(jobs) - MAX_JOBS + 1
+    for i, (finished_at, job_id) in enumerate(finished):
+        if i < excess or now - finished_at > JOB_TTL:
+            del jobs[job_id]
+
+
+def run_job(job_id: str):
+    with jobs_lock:
+        job = jobs[job_id]
+        # Cancelled after the executor already picked it up:
+        if job['status'] == 'cancelling':
+            job['status'] = 'cancelled'
+            job['finished_at'] = time.time()
+        if job['status'] != 'queued':
+            return
+        job['status'] = 'running'
+        job['started_at'] = time.time()
+
+    try:
+        # Never None here, the server would take the latest session (maybe another job's):
+        if job['session_id'] is None:
+            raise ValueError("No uploaded session to process.")
+        distributed_server.driver_function(job['session_id'], job['priority'])
+        status, error = 'completed', None
+    except Exception as e:
+        print(f"\033[91m[ERROR]\033[0m Job {job_id} failed: {e}")
+        status, error = 'failed', str(e)
+
+    with jobs_lock:
+        if status == 'completed' and job['status'] == 'cancelling':
+            status = 'cancelled'
+        job['status'] = status
+        job['error'] = error
+        job['finished_at'] = time.time()
+        # Last progress of the session, kept once it is dropped from the server:
+        if job['session_id'] is not None:
+            job['progress'] = distributed_server.get_progress(job['session_id'])
+
+
+def get_job(job_id: str) -> dict | None:
+    """Status of the job (with the live progress while it runs)."""
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+        info = {key: value for key, value in job.items() if key != 'future'}
+
+    if info['status'] in ('running', 'cancelling') and info['session_id'] is not None:
+        info['progress'] = distributed_server.get_progress(info['session_id'])
+    return info
+
+
+def cancel(job_id: str) -> dict | None:
+    """Cancels a queued job, or stops dispatching the frames of the running one."""
+    with jobs_lock:
+        job = jobs.get(job_id)
+        if job is None:
+            return None
+
+        if job['status'] == 'queued':
+            if job['future'].cancel():
+                job['status'] = 'cancelled'
+                job['finished_at'] = time.time()
+            else:
+                job['status'] = 'cancelling'
+
+        elif job['status'] == 'running':
+            job['status'] = 'cancelling'
+            if job['session_id'] is not None:
+                distributed_server.cancel(job['session_id'])
+
+    return get_job(job_id)
@@ -0,0 +1,252 @@
+import threading
+import numpy as np
+
+
+# ------------------------------------------------------------------------------
+# Incremental (streaming) attendance register:
+# ------------------------------------------------------------------------------
+
+# Min percentage of frames a student has to be present in:
+ATTENDANCE_THRESHOLD = 75
+
+NOT_SEEN = np.iinfo(np.int64).max
+
+
+class LiveRegister:
+    """
+    Attendance register which is updated as soon as each processed frame arrives.
+
+    Every `Processed Data` response is folded into per student arrays
+    (present count, first / last seen frame key), so provisional attendance
+    is available at any time and the final register needs no recompute pass.
+
+    Args:
+        stud_info_list (list): Students from the class register json.
+        expected_frames (int): Total frames of the session (including duplicates).
+        duplicates (list): [[duplicate frame key, representative frame key], ...]
+            The result of a representative frame is copied to its duplicates.
+        streaming (bool): Frames are still being uploaded (expected_frames is only
+            the announced count), the register is not complete till close() is called.
+    """
+
+    def __init__(self, stud_info_list: list, expected_frames: int, duplicates: list = None,
+                 streaming: bool = False):
+        self.students = stud_info_list
+        self.reg_nos = [stud['Reg_No'] for stud in stud_info_list]
+        self.row_of = {reg_no: i for i, reg_no in enumerate(self.reg_nos)}
+        self.expected_frames = expected_frames
+        self.streaming = streaming
+
+        self.copies_of = {}
+        for duplicate, representative in (duplicates or []):
+            self.copies_of.setdefault(representative, []).append(duplicate)
+
+        count = len(self.reg_nos)
+        self.present_count = np.zeros(count, dtype=np.int64)
+        self.first_in = np.full(count, NOT_SEEN, dtype=np.int64)
+        self.last_in = np.full(count, -1, dtype=np.int64)
+
+        # frame key -> presence vector of that frame:
+        self.columns = {}
+        self.lock = threading.Lock()
+
+    # --------------------------------------------------------------------------
+    # Updating:
+    # --------------------------------------------------------------------------
+
+    def get_presence_vector(self, people_present: list) -> np.ndarray:
+        vector = np.zeros(len(self.reg_nos), dtype=bool)
+        rows = [self.row_of[reg_no] for reg_no in people_present if reg_no in self.row_of]
+        vector[rows] = True
+        return vector
+
+    def add_response(self, response: dict) -> list:
+        """Folds one processed frame (and its duplicates) into the register.
+        Returns the frame keys which were added (a frame is only counted once)."""
+        vector = self.get_presence_vector(response['people_present'])
+        frame_key = response['frame_key']
+
+        with self.lock:
+            added = []
+            for key in [frame_key] + self.copies_of.get(frame_key, []):
+                if key in self.columns:
+                    continue
+                self.fold(key, vector)
+                added.append(key)
+            return added
+
+    def add_duplicate(self, duplicate: int, representative: int):
+        """Duplicate found after the register was created (streaming upload),
+        folded right away if the representative's result is already in."""
+        with self.lock:
+            self.copies_of.setdefault(representative, []).append(duplicate)
+            if representative in self.columns and duplicate not in self.columns:
+                self.fold(duplicate, self.columns[representative])
+
+    def close(self, expected_frames: int):
+        """Upload is over, the actual frame count is known now."""
+        with self.lock:
+            self.expected_frames = expected_frames
+            self.streaming = False
+
+    def fold(self, frame_key: int, vector: np.ndarray):
+        self.columns[frame_key] = vector
+        self.present_count += vector
+        self.first_in = np.where(vector, np.minimum(self.first_in, frame_key), self.first_in)
+        self.last_in = np.where(vector, np.maximum(self.last_in, frame_key), self.last_in)
+
+    # --------------------------------------------------------------------------
+    # Reading:
+    # --------------------------------------------------------------------------
+
+    def frames_done(self) -> int:
+        return len(self.columns)
+
+    def is_complete(self) -> bool:
+        return not self.streaming and self.frames_done() >= self.expected_frames
+
+    def get_decided(self) -> tuple:
+        """
+        Students whose status can not change anymore, whatever the remaining frames show.
+        (The 75% rule is checked against all the expected frames of the session)
+
+        Returns:
+            tuple: (decided present mask, decided absent mask)
+        """
+        total = max(self.expected_frames, 1)
+        absent_count = self.frames_done() - self.present_count
+
+        # Even if all the remaining frames are absent / present:
+        min_percentage = np.round(self.present_count / total * 100)
+        max_percentage = np.round((total - absent_count) / total * 100)
+        return min_percentage >= ATTENDANCE_THRESHOLD, max_percentage < ATTENDANCE_THRESHOLD
+
+    def all_decided(self) -> bool:
+        with self.lock:
+            decided_present, decided_absent = self.get_decided()
+            return bool(np.all(decided_present | decided_absent))
+
+    def frame_weight(self, frame_key: int) -> int:
+        """Frames this result counts for (the frame itself and its duplicates)."""
+        return 1 + len(self.copies_of.get(frame_key, []))
+
+    def needed_for_boundaries(self, frame_keys: list) -> list:
+        """
+        Frames (out of the given ones) which can still change First_In / Last_In
+        of a (decided) present student: earlier than the first or later than the last seen frame.
+        Absent students' In / Out times are only kept as seen in the processed frames.
+        """
+        with self.lock:
+            seen, _ = self.get_decided()
+            if not np.any(seen):
+                return []
+            latest_first_in = int(self.first_in[seen].max())
+            earliest_last_in = int(self.last_in[seen].min())
+
+        needed = []
+        for frame_key in frame_keys:
+            keys = [frame_key] + self.copies_of.get(frame_key, [])
+            if min(keys) < latest_first_in or max(keys) > earliest_last_in:
+                needed.append(frame_key)
+        return needed
+
+    def get_percentages(self) -> list:
+        """Percentage of (processed) frames each student is present in."""
+        done = self.frames_done()
+        if done == 0:
+            return [0] * len(self.reg_nos)
+        return [round((present / done) * 100) for present in self.present_count.tolist()]
+
+    def get_provisional(self) -> dict:
+        """Attendance so far, while the frames are still being processed."""
+        with self.lock:
+            percentages = self.get_percentages()
+            done = self.frames_done()
+            decided_present, decided_absent = self.get_decided()
+            return {
+                'frames_done': done,
+                'frames_total': self.expected_frames,
+                'frames_remaining': max(self.expected_frames - done, 0),
+                'complete': not self.streaming and done >= self.expected_frames,
+                'undecided': int(np.sum(~(decided_present | decided_absent))),
+                'students': {
+                    reg_no: {
+                        'Name': stud['Name'],
+                        'Present': count,
+                        'Percentage': percentage,
+                        'Status': 'Present' if percentage >= ATTENDANCE_THRESHOLD else 'Absent',
+                    } for reg_no, stud, count, percentage in zip(
+                        self.reg_nos, self.students, self.present_count.tolist(), percentages)
+                }
+            }
+
+    def to_register(self, debug: bool = False) -> dict:
+        """The attendance register ({Reg_No: {Name, First_In, Last_In, Attendance, Percentage, Status...}}).
+        Compiled from the presence matrix of the folded frames (see build_presence_matrix)."""
+        with self.lock:
+            keys, matrix = build_presence_matrix(self.columns, len(self.reg_nos))
+
+        frames_count = len(keys)
+        present_counts = matrix.sum(axis=1).tolist()
+        first_in, last_in = get_first_last_in(keys, matrix)
+        key_list = keys.tolist()
+
+        register = {}
+        for i, stud in enumerate(self.students):
+            percentage = round(present_counts[i] / frames_count * 100) if frames_count else 0
+            register[stud['Reg_No']] = {
+                'Name': stud['Name'],
+                'Reg_No': stud['Reg_No'],
+                "Disp_name": stud['Disp_name'],
+
+                "First_In": first_in[i],
+                "Last_In": last_in[i],
+                "Attendance": dict(zip(key_list, matrix[i].tolist())),
+                "Percentage": percentage,
+                "Status": 'Present' if percentage >= ATTENDANCE_THRESHOLD else 'Absent',
+            }
+
+        if debug:
+            print_register(register, present_counts, frames_count)
+        return register
+
+
+def build_presence_matrix(columns: dict, students_count: int) -> tuple:
+    """
+    Builds the (students x frames) boolean presence matrix of the folded frames.
+
+    Returns:
+        tuple: (frame keys array, presence matrix), frames are the columns in key order.
+    """
+    keys = sorted(columns)
+    if not keys:
+        return np.zeros(0, dtype=np.int64), np.zeros((students_count, 0), dtype=bool)
+    return np.array(keys, dtype=np.int64), np.stack([columns[key] for key in keys], axis=1)
+
+
+def get_first_last_in(keys: np.ndarray, matrix: np.ndarray) -> tuple:
+    """First_In / Last_In frame key of every student (first / last true column), -1 if never seen."""
+    frames_count = matrix.shape[1]
+    if frames_count == 0:
+        # No frame at all (ex. every result failed), argmax of an empty row is an error:
+        return [-1] * matrix.shape[0], [-1] * matrix.shape[0]
+
+    seen = matrix.any(axis=1)
+    first_index = matrix.argmax(axis=1)
+    last_index = frames_count - 1 - matrix[:, ::-1].argmax(axis=1)
+    first_in = np.where(seen, keys[first_index], -1)
+    last_in = np.where(seen, keys[last_index], -1)
+    return first_in.tolist(), last_in.tolist()
+
+
+def print_register(register: dict, present_counts: list, frames_count: int):
+    print(f'\n[Attendance Info]: Marking attendance...')
+    print(f'    | {"Reg".center(10)} | {"Name".center(15)} | {"Present".center(10)} | {"Absent".center(10)} | {"Percentage".center(10)} | {"Status".center(10)} |')
+
+    for stud, present in zip(register.values(), present_counts):
+        t_reg = str(stud['Reg_No']).center(10)
+        t_name = str(stud['Name'][:15]).center(15)
+        absent = frames_count - present
+
+        print(
+            f'    | {t_reg} | {t_name} | {str(present).center(10)} | {str(absent).center(10)} | {str(stud["Percentage"]).center(10)} | {stud["Status"].center(10)} |')
@@ -1,13 +1,61 @@
 import os
 import json
-from threading import Lock
+import heapq
+import queue
+import bisect
+import atexit
+import itertools
+import threading
+from threading import Lock, Condition
 from datetime import datetime
+from batch_writer import collect_batches
 
+# ------------------------------------------------------------------------------
+# Network logger:
+# ------------------------------------------------------------------------------
+# create_log() only builds the record and queues it, a background thread
+# appends the queued records (as JSON lines) to the log file in batches
+# and rotates the file once it grows over MAX_FILE_SIZE:
+#   network_logs.jsonl -> network_logs.jsonl.1 -> ... -> .BACKUP_COUNT
+# The server also indexes them in the session store (see set_log_store),
+# the file stays the full log.
+# ------------------------------------------------------------------------------
+
+# Recent logs (ids are increasing, so `log_ids` is sorted and searched with bisect):
+MAX_LOGS_IN_MEMORY = 10000
 logs = []
-log_count = 1
+log_ids = []
+
+# topic / client_id -> ids of its logs (sorted as well):
+logs_by_topic = {}
+logs_by_client = {}
+
 log_lock = Lock()
+new_log = Condition(log_lock)
+_ids = itertools.count(1)
+
+log_file = os.path.join('Jsons', 'network_logs.jsonl')
+
+FLUSH_AT = 64                   # records which trigger a write
+FLUSH_INTERVAL = 0.5            # max seconds a record waits in the queue
+MAX_FILE_SIZE = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+# Optional index of the logs (the server sets it to the session store),
+# needs an `add_log(log)` fn. The logs always go to the log_file as well:
+log_store = None
 
-log_file = os.path.join('Jsons/network_logs.json')
+_queue = queue.Queue()
+_writer_thread = None
+
+
+def set_log_store(store):
+    """Also index the logs in the store (needs `add_log(log)` and `get_last_log_id()`),
+    ids continue after the last log already in the store."""
+    global log_store, _ids
+    with log_lock:
+        log_store = store
+        _ids = itertools.count(store.get_last_log_id() + 1)
 
 
 def get_timestamp():
@@ -15,48 +63,177 @@ def get_timestamp():
 
 
 def create_log(topic, message, status='Success', client_id=-1):
-    global log_count
-    log = {
-        'id': log_count,
-        'topic': topic,
-        'message': message,
-        'status': status,
-        'client_id': int(client_id),
-        'timestamp': get_timestamp()
-    }
+    start_writer()
+
+    # Id, in-memory and file order are assigned together:
+    with log_lock:
+        log = {
+            'id': next(_ids),
+            'topic': topic,
+            'message': message,
+            'status': status,
+            'client_id': int(client_id),
+            'timestamp': get_timestamp()
+        }
+        add_to_index(log)
+        _queue.put(log)
+        new_log.notify_all()
+    return log
 
+
+# ------------------------------------------------------------------------------
+# In-memory index and queries:
+# ------------------------------------------------------------------------------
+
+
+def add_to_index(log: dict):
     logs.append(log)
-    log_count += 1
-    save_logs()
+    log_ids.append(log['id'])
+    logs_by_topic.setdefault(log['topic'], []).append(log['id'])
+    logs_by_client.setdefault(log['client_id'], []).append(log['id'])
+
+    # Drop the oldest 10% at once, so trimming is rare:
+    if len(logs) > MAX_LOGS_IN_MEMORY:
+        drop = len(logs) - MAX_LOGS_IN_MEMORY + MAX_LOGS_IN_MEMORY // 10
+        first_id = log_ids[drop]
+        del logs[:drop]
+        del log_ids[:drop]
+        for index in (logs_by_topic, logs_by_client):
+            for key in list(index):
+                del index[key][:bisect.bisect_left(index[key], first_id)]
+                if not index[key]:
+                    del index[key]
 
 
 def get_log(log_id: int) -> dict:
-    for log in logs:
-        if log['id'] == log_id:
-            return log
+    with log_lock:
+        i = bisect.bisect_left(log_ids, log_id)
+        if i < len(log_ids) and log_ids[i] == log_id:
+            return logs[i]
     return False
 
 
 def get_log_after(log_id: int) -> list:
-    """Get all logs after the given log_id"""
-    logs_after = []
-    for log in logs:
-        if log['id'] > log_id:
-            logs_after.append(log)
-    return logs_after
+    """Get all (in-memory) logs after the given log_id"""
+    with log_lock:
+        return logs[bisect.bisect_right(log_ids, log_id):]
 
 
 def get_log_by_topic(topic: str) -> list:
-    """Get all logs with the given topic"""
-    logs_by_topic = []
-    for log in logs:
-        if topic in log['topic']:
-            logs_by_topic.append(log)
-    return logs_by_topic
+    """Get all (in-memory) logs with the given topic (or part of the topic)"""
+    return query_logs(topic=topic, limit=None)[0]
 
 
-def save_logs():
-    # Acquire the lock before writing to the file
+def query_logs(after_id: int = 0, topic: str = None, client_id: int = None,
+               limit: int = 100) -> tuple:
+    """
+    Logs after the cursor, filtered by topic (part of the topic) and / or client_id.
+
+    Returns:
+        tuple: (logs, cursor), pass the cursor as after_id to get the next page.
+        Once the matching logs run out, the cursor is the newest log scanned, so
+        wait_for_logs(cursor) only wakes up for logs which were not looked at yet.
+    """
+    with log_lock:
+        if topic is None and client_id is None:
+            start = bisect.bisect_right(log_ids, after_id)
+            end = None if limit is None else start + limit
+            page = logs[start:end]
+            exhausted = end is None or end >= len(logs)
+        else:
+            # Ids in order from the smallest index (only read as far as the page needs):
+            if client_id is not None:
+                sources = [logs_by_client.get(int(client_id), [])]
+            else:
+                sources = [ids for name, ids in logs_by_topic.items() if topic in name]
+            candidates = heapq.merge(*(
+                (ids[i] for i in range(bisect.bisect_right(ids, after_id), len(ids)))
+                for ids in sources))
+
+            page = []
+            exhausted = True
+            for log_id in candidates:
+                log = logs[bisect.bisect_left(log_ids, log_id)]
+                if topic is not None and topic not in log['topic']:
+                    continue
+                page.append(log)
+                if limit is not None and len(page) >= limit:
+                    exhausted = False
+                    break
+
+        if exhausted and log_ids:
+            cursor = max(after_id, log_ids[-1])
+        else:
+            cursor = page[-1]['id'] if page else after_id
+    return page, cursor
+
+
+def wait_for_logs(after_id: int, timeout: float = None) -> bool:
+    """Block till there is a log after the given id (or the timeout), returns True if there is."""
     with log_lock:
-        with open(log_file, 'w') as f:
-            json.dump(logs, f, indent=4)
+        return new_log.wait_for(lambda: bool(log_ids) and log_ids[-1] > after_id, timeout)
+
+
+# ------------------------------------------------------------------------------
+# Background writer:
+# ------------------------------------------------------------------------------
+
+
+def start_writer():
+    global _writer_thread
+    if _writer_thread is not None:
+        return
+    with log_lock:
+        if _writer_thread is None:
+            _writer_thread = threading.Thread(target=_writer, daemon=True)
+            _writer_thread.start()
+            atexit.register(save_logs)
+
+
+def _writer():
+    for records, flushes in collect_batches(_queue, FLUSH_AT, FLUSH_INTERVAL):
+        try:
+            if records:
+                write_records(records)
+        except Exception as e:
+            print(f"\033[91m[ERROR]\033[0m Network logs could not be saved: {e}")
+
+        for done in flushes:
+            done.set()
+
+
+def write_records(records: list):
+    if log_store is not None:
+        for log in records:
+            log_store.add_log(log)
+
+    folder = os.path.dirname(log_file)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    with open(log_file, 'a', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(log, default=str) + '\n' for log in records))
+        size = f.tell()
+
+    if size >= MAX_FILE_SIZE:
+        rotate_logs()
+
+
+def rotate_logs():
+    """network_logs.jsonl.N is dropped, the rest are shifted by one."""
+    for i in range(BACKUP_COUNT - 1, 0, -1):
+        if os.path.exists(f'{log_file}.{i}'):
+            os.replace(f'{log_file}.{i}', f'{log_file}.{i + 1}')
+    if BACKUP_COUNT > 0:
+        os.replace(log_file, f'{log_file}.1')
+    else:
+        os.remove(log_file)
+
+
+def save_logs():
+    """Block till all the logs created so far are written."""
+    if _writer_thread is None:
+        return
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout=5)
@@ -0,0 +1,195 @@
+import time
+import bisect
+import threading
+from collections import deque
+
+
+# ------------------------------------------------------------------------------
+# In-process metrics registry (Prometheus text format):
+# ------------------------------------------------------------------------------
+# - counter:   only goes up (bytes sent, frames processed, ...)
+# - gauge:     set / add (queue depth, tasks in flight, ...)
+# - histogram: fixed buckets (latencies), exported with the estimated
+#              p50 / p90 / p99 as `<name>_percentile{quantile="..."}`
+# - rate:      events per second over the last RATE_WINDOW seconds
+#
+# Every sample is keyed by (metric name, labels), labels are keyword args:
+#   metrics.inc('bytes_sent_total', 512, topic='Dynamic Task')
+# ------------------------------------------------------------------------------
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PERCENTILES = (0.5, 0.9, 0.99)
+RATE_WINDOW = 10.0
+
+# name: (type, help)
+METRICS = {
+    'messages_total': ('counter', 'Protocol messages sent / received, by client and status.'),
+    'bytes_sent_total': ('counter', 'Bytes sent on the sockets (including the size prefix).'),
+    'bytes_received_total': ('counter', 'Bytes received on the sockets (including the size prefix).'),
+    'send_seconds': ('histogram', 'Time to send a message till its ACK arrives.'),
+    'recv_seconds': ('histogram', 'Time to read a message (after its size arrived) and ACK it.'),
+    'task_seconds': ('histogram', 'Time from sending a frame to a client till its result arrives.'),
+    'frames_processed_total': ('counter', 'Frame results received, by client.'),
+    'face_encodings_total': ('counter', 'Faces encoded / encodings avoided by face tracking (static mode), by client.'),
+    'frames_per_second': ('rate', f'Frame results per second by client (last {int(RATE_WINDOW)} s).'),
+    'task_queue_depth': ('gauge', 'Frames waiting to be sent to a client.'),
+    'tasks_in_flight': ('gauge', 'Frames sent to a client whose result has not arrived yet.'),
+    'client_warm_seconds': ('gauge', 'Warm per-frame latency each client measured before reporting ready.'),
+}
+
+_lock = threading.Lock()
+_values = {}        # (name, labels) -> float
+_histograms = {}    # (name, labels) -> [bucket counts..., +Inf count, sum]
+_rates = {}         # (name, labels) -> deque of event times
+
+
+def get_key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+# ------------------------------------------------------------------------------
+# Updating:
+# ------------------------------------------------------------------------------
+
+
+def inc(name: str, value: float = 1, **labels):
+    key = get_key(name, labels)
+    with _lock:
+        _values[key] = _values.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _values[get_key(name, labels)] = value
+
+
+def observe(name: str, value: float, **labels):
+    key = get_key(name, labels)
+    with _lock:
+        counts = _histograms.get(key)
+        if counts is None:
+            counts = _histograms[key] = [0] * (len(LATENCY_BUCKETS) + 2)
+        counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        counts[-1] += value
+
+
+def mark(name: str, count: int = 1, **labels):
+    """Records `count` events now (for a rate metric)."""
+    key = get_key(name, labels)
+    now = time.monotonic()
+    with _lock:
+        events = _rates.setdefault(key, deque())
+        events.extend([now] * count)
+        drop_old_events(events, now)
+
+
+def drop_old_events(events: deque, now: float):
+    while events and events[0] < now - RATE_WINDOW:
+        events.popleft()
+
+
+class Timer:
+    """with metrics.Timer('send_seconds', topic=...): ... observes the time taken."""
+
+    def __init__(self, name: str, **labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+# ------------------------------------------------------------------------------
+# Reading:
+# ------------------------------------------------------------------------------
+
+
+def get_percentile(counts: list, q: float) -> float:
+    """Percentile estimated from the bucket counts (linear inside the bucket)."""
+    total = sum(counts[:-1])
+    if total == 0:
+        return 0.0
+
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts[:-1]):
+        if seen + count >= rank and count > 0:
+            lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+            # Over the last bucket, nothing better than its lower bound:
+            if i == len(LATENCY_BUCKETS):
+                return lower
+            upper = LATENCY_BUCKETS[i]
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return LATENCY_BUCKETS[-1]
+
+
+def format_labels(labels: tuple, extra: tuple = ()) -> str:
+    labels = labels + extra
+    if not labels:
+        return ''
+    pairs = ','.join(f'{key}="{escape(value)}"' for key, value in labels)
+    return '{' + pairs + '}'
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def render() -> str:
+    """All the metrics in the Prometheus text exposition format."""
+    now = time.monotonic()
+    with _lock:
+        values = dict(_values)
+        histograms = {key: list(counts) for key, counts in _histograms.items()}
+        rates = {}
+        for key, events in _rates.items():
+            drop_old_events(events, now)
+            rates[key] = len(events) / RATE_WINDOW
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {"gauge" if kind == "rate" else kind}')
+
+        if kind in ('counter', 'gauge'):
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+
+        elif kind == 'rate':
+            for (metric, labels), value in sorted(rates.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {round(value, 3)}')
+
+        else:
+            percentiles = []
+            for (metric, labels), counts in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{format_labels(labels, (("le", str(bound)),))} {cumulative}')
+                cumulative += counts[-2]
+                lines.append(f'{name}_bucket{format_labels(labels, (("le", "+Inf"),))} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {counts[-1]}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+                for q in PERCENTILES:
+                    percentiles.append(
+                        f'{name}_percentile{format_labels(labels, (("quantile", str(q)),))} '
+                        f'{round(get_percentile(counts, q), 6)}')
+
+            if percentiles:
+                lines.append(f'# HELP {name}_percentile Estimated from the {name} buckets.')
+                lines.append(f'# TYPE {name}_percentile gauge')
+                lines.extend(percentiles)
+
+    return '\n'.join(lines) + '\n'
@@ -2,8 +2,9 @@ import os
 import json
 import base64
 # import socket
+import metrics
 import logger as l
-from time import sleep
+from time import sleep, perf_counter
 from datetime import datetime
 
 
@@ -88,6 +89,7 @@ def receive_message(
         message_size = int.from_bytes(message_size_bytes, "big")
         if message_size <= 0:
             raise ValueError("Invalid message size.")
+        start = perf_counter()
 
         # Read the actual message
         # data = client_socket.recv(message_size)
@@ -116,6 +118,10 @@ def receive_message(
         msg = "ACK"
         client_socket.sendall(msg.encode("utf-8"))
 
+        metrics.inc("bytes_received_total", 4 + message_size)
+        metrics.observe("recv_seconds", perf_counter() - start,
+                        topic=response.get("topic"))
+
         return True, response
 
     except Exception as e:
@@ -146,6 +152,7 @@ def send_message(
     topic: str,
     message: str = None,
     file_path: str = None,
+    trace_id: str = None,
     max_attempts: int = 3,
     current_attempt: int = None,
 ):
@@ -156,6 +163,7 @@ def send_message(
         topic (str): The topic of the message.
         message (str): The message to send.
         file_path (str): The path to the file to send.
+        trace_id (str): Trace id of the frame (sent as `trace`), to trace it on the receiver.
         max_attempts (int): The maximum number of attempts to send the message.
         current_attempt (int): The current attempt number.
 
@@ -174,6 +182,8 @@ def send_message(
         current_attempt = 0
 
     try:
+        start = perf_counter()
+
         # Construct the JSON message
         to_send = {
             "topic": topic,
@@ -202,14 +212,19 @@ def send_message(
         if message:
             to_send["message"] = message
 
+        if trace_id is not None:
+            to_send["trace"] = trace_id
+
         # Convert to JSON and send
         json_message = json.dumps(to_send).encode("utf-8")
         client_socket.sendall(len(json_message).to_bytes(4, "big"))
         client_socket.sendall(json_message)
+        metrics.inc("bytes_sent_total", 4 + len(json_message))
 
         # Get the 'ACK' response
         response = client_socket.recv(4).decode("utf-8")
         if response == "ACK":
+            metrics.observe("send_seconds", perf_counter() - start, topic=topic)
             return True, ""
 
         elif response == "NACK":
@@ -219,6 +234,7 @@ def send_message(
                 topic=topic,
                 message=message,
                 file_path=file_path,
+                trace_id=trace_id,
                 max_attempts=max_attempts,
                 current_attempt=current_attempt,
             )
@@ -240,6 +256,7 @@ def send_message(
                 topic=topic,
                 message=message,
                 file_path=file_path,
+                trace_id=trace_id,
                 max_attempts=max_attempts,
                 current_attempt=current_attempt,
             )
@@ -277,6 +294,9 @@ def handle_recv(status: bool, resp: dict | str, expected_topic: str,
         dict | str: The response if the response is valid, else an error-message if the response is invalid and raising exception is not allowed.
     """
 
+    metrics.inc("messages_total", direction="received", client=log_client_id,
+                status="ok" if status and resp["topic"] == expected_topic else "error")
+
     # True - Received successfully:
     if status:
         # Got what was expected:
@@ -339,6 +359,9 @@ def handle_send(status: bool, resp: str, raise_exception: bool = True,
         bool: True if the response is valid, else error-message if the response is invalid and raising exception is not allowed.
     """
 
+    metrics.inc("messages_total", direction="sent", client=log_client_id,
+                status="ok" if status else "error")
+
     # True - Sent successfully:
     if status:
         if log_topic:
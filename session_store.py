@@ -0,0 +1,322 @@
+import os
+import json
+import time
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from dotenv import load_dotenv
+from batch_writer import collect_batches
+
+
+# ------------------------------------------------------------------------------
+# Persistent session store (SQLite):
+# ------------------------------------------------------------------------------
+# Replaces the whole-file json handoffs between the web server and the
+# distributed server (uploaded_data, attend_raw, attend_register, network_logs).
+#
+# - All writes go through one background writer thread, which commits them
+#   in batches (one transaction per batch). If a batch fails, its writes are
+#   retried one by one, so one bad row never drops the others. flush() raises
+#   the first failed write of the calling thread.
+# - The database runs in WAL mode, so readers (flask routes) never block the
+#   writer and the writer never blocks readers.
+# - Every reading thread gets its own connection.
+# ------------------------------------------------------------------------------
+
+load_dotenv()
+
+DB_FILE = os.environ.get('session_db', os.path.join('Jsons', 'sessions.db'))
+
+BATCH_SIZE = 256           # max writes per transaction
+BATCH_INTERVAL = 0.2       # max seconds a write waits for its batch
+
+# Processing modes a session can be saved with (see distributed_server):
+PROCESSING_MODES = ('static', 'dynamic', 'adaptive', 'pipeline')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    frame_count INTEGER NOT NULL,
+    processing_mode TEXT NOT NULL,
+    recognition_profile TEXT
+);
+
+CREATE TABLE IF NOT EXISTS frames (
+    session_id TEXT NOT NULL,
+    frame_key INTEGER NOT NULL,
+    file TEXT NOT NULL,
+    py_stamp TEXT,
+    duplicate_of INTEGER,
+    PRIMARY KEY (session_id, frame_key)
+);
+
+CREATE TABLE IF NOT EXISTS results (
+    session_id TEXT NOT NULL,
+    frame_key INTEGER NOT NULL,
+    client_id INTEGER,
+    response TEXT NOT NULL,
+    received_at REAL NOT NULL,
+    PRIMARY KEY (session_id, frame_key)
+);
+
+CREATE TABLE IF NOT EXISTS registers (
+    session_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    register TEXT NOT NULL,
+    saved_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    message TEXT,
+    status TEXT,
+    client_id INTEGER,
+    timestamp TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_logs_topic ON logs (topic);
+CREATE INDEX IF NOT EXISTS idx_logs_client ON logs (client_id);
+CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions (created_at);
+"""
+
+_write_queue = queue.Queue()
+_writer_thread = None
+_init_lock = threading.Lock()
+_local = threading.local()
+
+
+# ------------------------------------------------------------------------------
+# Connections and the writer thread:
+# ------------------------------------------------------------------------------
+
+
+def connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_FILE, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def init():
+    """Create the tables (if needed) and start the writer thread (only once)."""
+    global _writer_thread
+    with _init_lock:
+        if _writer_thread is not None:
+            return
+
+        folder = os.path.dirname(DB_FILE)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        conn = connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        conn.close()
+
+        _writer_thread = threading.Thread(target=_writer, daemon=True)
+        _writer_thread.start()
+
+
+def _writer():
+    conn = connect()
+
+    # One transaction per batch:
+    for writes, flushes in collect_batches(_write_queue, BATCH_SIZE, BATCH_INTERVAL):
+        try:
+            with conn:
+                for sql, params, _ in writes:
+                    conn.execute(sql, params)
+        except Exception:
+            # One bad statement rolled back the whole batch, retry them one by one:
+            for sql, params, status in writes:
+                try:
+                    with conn:
+                        conn.execute(sql, params)
+                except Exception as e:
+                    print(f"\033[91m[ERROR]\033[0m Session store write failed: {e}")
+                    if status['error'] is None:
+                        status['error'] = e
+
+        # Wake up the threads waiting in flush():
+        for done in flushes:
+            done.set()
+
+
+def write(sql: str, params: tuple = ()):
+    """Queue a write, it is committed with the next batch."""
+    init()
+    # First failed write of this thread since its last flush() (gone with the thread):
+    status = getattr(_local, 'write_status', None)
+    if status is None:
+        status = _local.write_status = {'error': None}
+    _write_queue.put((sql, params, status))
+
+
+def flush():
+    """Block till all the queued writes are committed.
+    Raises the first write of this thread which failed (since its last flush)."""
+    init()
+    done = threading.Event()
+    _write_queue.put(done)
+    done.wait()
+
+    status = getattr(_local, 'write_status', None)
+    if status is not None and status['error'] is not None:
+        error, status['error'] = status['error'], None
+        raise error
+
+
+def read(sql: str, params: tuple = ()) -> list:
+    """Run a query on this thread's own connection."""
+    init()
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = connect()
+        conn.row_factory = sqlite3.Row
+        _local.conn = conn
+    return conn.execute(sql, params).fetchall()
+
+
+# ------------------------------------------------------------------------------
+# Sessions and frames (written by the web server on upload):
+# ------------------------------------------------------------------------------
+
+
+def new_session_id() -> str:
+    return datetime.now().strftime('%Y-%m-%d_%Hh%Mm%Ss_%f')
+
+
+def save_session(session_id: str, frame_count: int, processing_mode: str,
+                 recognition_profile: str, files: list, py_stamps: list,
+                 frame_keys: list, duplicates: list):
+    """Saves the uploaded session and its frames (replaces uploaded_data.json).
+    Raises ValueError for an unknown processing mode, sqlite3.Error if it could not be saved."""
+    if processing_mode not in PROCESSING_MODES:
+        raise ValueError(f"Invalid processing mode: {processing_mode}")
+    duplicate_of = dict(duplicates)
+
+    write('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?, ?, ?)',
+          (session_id, datetime.now().isoformat(), frame_count,
+           processing_mode, recognition_profile))
+
+    for file, py_stamp, frame_key in zip(files, py_stamps, frame_keys):
+        write('INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?, ?)',
+              (session_id, frame_key, file, py_stamp, duplicate_of.get(frame_key)))
+
+    # Scheduler reads it right after the upload:
+    flush()
+
+
+def get_latest_session_id() -> str | None:
+    rows = read('SELECT session_id FROM sessions ORDER BY created_at DESC LIMIT 1')
+    return rows[0]['session_id'] if rows else None
+
+
+def get_upload_data(session_id: str) -> dict | None:
+    """Same shape as the old uploaded_data.json (files / keys in frame order)."""
+    rows = read('SELECT * FROM sessions WHERE session_id = ?', (session_id,))
+    if not rows:
+        return None
+    session = rows[0]
+
+    frames = read('SELECT frame_key, file, py_stamp, duplicate_of FROM frames '
+                  'WHERE session_id = ? ORDER BY frame_key', (session_id,))
+    return {
+        'session_id': session_id,
+        'frame_count': session['frame_count'],
+        'processing_mode': session['processing_mode'],
+        'recognition_profile': session['recognition_profile'],
+        'files': [frame['file'] for frame in frames],
+        'py': [frame['py_stamp'] for frame in frames],
+        'keys': [frame['frame_key'] for frame in frames],
+        'duplicates': [[frame['frame_key'], frame['duplicate_of']]
+                       for frame in frames if frame['duplicate_of'] is not None],
+    }
+
+
+def get_frame_key_range(session_id: str) -> tuple:
+    """(first, last) frame key of the session."""
+    rows = read('SELECT MIN(frame_key) AS first, MAX(frame_key) AS last '
+                'FROM frames WHERE session_id = ?', (session_id,))
+    return rows[0]['first'], rows[0]['last']
+
+
+# ------------------------------------------------------------------------------
+# Per frame results (written by the distributed server as they arrive):
+# ------------------------------------------------------------------------------
+
+
+def add_result(session_id: str, response: dict, client_id=None):
+    write('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)',
+          (session_id, response['frame_key'],
+           None if client_id is None else int(client_id),
+           json.dumps(response), time.time()))
+
+
+def get_results(session_id: str) -> list:
+    rows = read('SELECT response FROM results WHERE session_id = ? ORDER BY frame_key',
+                (session_id,))
+    return [json.loads(row['response']) for row in rows]
+
+
+# ------------------------------------------------------------------------------
+# Compiled registers:
+# ------------------------------------------------------------------------------
+
+
+def save_register(session_id: str, register: dict) -> int:
+    """Saves the register of the session, returns its (new) version.
+    The version is bumped inside the insert, so concurrent saves never share one."""
+    write('INSERT OR REPLACE INTO registers VALUES '
+          '(?, COALESCE((SELECT version FROM registers WHERE session_id = ?), 0) + 1, ?, ?)',
+          (session_id, session_id, json.dumps(register), datetime.now().isoformat()))
+    flush()
+    return get_register_version(session_id)[1]
+
+
+def get_register(session_id: str = None) -> dict | None:
+    """Register of the given session (or of the latest compiled session)."""
+    if session_id is None:
+        rows = read('SELECT register FROM registers ORDER BY saved_at DESC LIMIT 1')
+    else:
+        rows = read('SELECT register FROM registers WHERE session_id = ?', (session_id,))
+    return json.loads(rows[0]['register']) if rows else None
+
+
+def get_register_version(session_id: str = None) -> tuple | None:
+    """(session id, version) of the register of the session (or of the latest compiled
+    session), a cheap check before using a cached copy (the register is not read)."""
+    if session_id is None:
+        rows = read('SELECT session_id, version FROM registers ORDER BY saved_at DESC LIMIT 1')
+    else:
+        rows = read('SELECT session_id, version FROM registers WHERE session_id = ?', (session_id,))
+    return (rows[0]['session_id'], rows[0]['version']) if rows else None
+
+
+def get_latest_register_session_id() -> str | None:
+    rows = read('SELECT session_id FROM registers ORDER BY saved_at DESC LIMIT 1')
+    return rows[0]['session_id'] if rows else None
+
+
+# ------------------------------------------------------------------------------
+# Network logs:
+# ------------------------------------------------------------------------------
+
+
+def add_log(log: dict):
+    write('INSERT OR REPLACE INTO logs VALUES (?, ?, ?, ?, ?, ?)',
+          (log['id'], log['topic'], str(log['message']), log['status'],
+           log['client_id'], log['timestamp']))
+
+
+def get_last_log_id() -> int:
+    rows = read('SELECT MAX(id) AS last FROM logs')
+    return rows[0]['last'] or 0
+
+
+def get_logs(after_id: int = 0, limit: int = 100) -> list:
+    rows = read('SELECT * FROM logs WHERE id > ? ORDER BY id LIMIT ?', (after_id, limit))
+    return [dict(row) for row in rows]
@@ -0,0 +1,67 @@
+import os
+import sys
+import json
+import time
+import threading
+import importlib
+
+
+# ------------------------------------------------------------------------------
+# Startup timing report:
+# ------------------------------------------------------------------------------
+# Imported first by the web server and the coordinator, every mark() records
+# the time taken since the previous mark (imports, init steps, ...):
+#   import startup
+#   import flask ...
+#   startup.mark('import flask')
+#
+# report() prints the steps and saves them to `Jsons/startup_<role>.json`.
+# Heavy modules only some routes need (ex. pandas for /download) are loaded
+# with lazy_import() on first use, the import time is printed then.
+# ------------------------------------------------------------------------------
+
+STARTED = time.perf_counter()
+
+_last = STARTED
+steps = []          # [(name, seconds), ...]
+
+INFO = '\033[94m[INFO]\033[0m'
+
+# A module is in sys.modules while another thread is still importing it:
+_import_lock = threading.Lock()
+
+
+def mark(name: str, since: float = None) -> float:
+    """Records the step `name` as taking the time since `since` (the previous mark if not given)."""
+    global _last
+    now = time.perf_counter()
+    seconds = now - (_last if since is None else since)
+    steps.append((name, round(seconds, 4)))
+    if since is None:
+        _last = now
+    return seconds
+
+
+def report(role: str):
+    """Prints the steps so far and saves them (Jsons/startup_<role>.json)."""
+    total = time.perf_counter() - STARTED
+    print(f"{INFO} Startup ({role}) took {total:.3f} secs:")
+    for name, seconds in steps:
+        print(f"\t{name.ljust(28)} : {seconds:.3f} secs")
+
+    folder = os.environ.get('jsons_folder', 'Jsons')
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, f'startup_{role}.json'), 'w') as f:
+        json.dump({'total': round(total, 4), 'steps': dict(steps)}, f, indent=4)
+
+
+def lazy_import(module_name: str):
+    """The module, imported on first use (its import time is recorded and printed)."""
+    with _import_lock:
+        module = sys.modules.get(module_name)
+        if module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(module_name)
+            seconds = mark(f'import {module_name} (lazy)', since=start)
+            print(f"{INFO} Loaded `{module_name}` on first use in {seconds:.3f} secs.")
+    return module
@@ -0,0 +1,173 @@
+import os
+import json
+import time
+import threading
+from dotenv import load_dotenv
+
+
+# ------------------------------------------------------------------------------
+# Per frame tracing (Chrome trace format):
+# ------------------------------------------------------------------------------
+# Every frame is traced with `<session id>:<frame key>` as the trace id (frame
+# keys of concurrent sessions can be the same), which goes to the client with
+# the frame (`trace` field of the message). Spans are recorded:
+#   server: saving the upload, sending the frame, waiting for the result,
+#           storing the result
+#   client: receiving -> processing (and its stages) -> sending the result,
+#           sent back inside the processed data
+#
+# Client clocks are aligned NTP style: the client reports when it got the
+# frame and when it sent the result, the server knows when it sent the frame
+# and when the result arrived. Per client, the sample with the least network
+# time gives the clock offset.
+#
+# save_trace() writes the merged `trace.json`, which loads in
+# chrome://tracing or https://ui.perfetto.dev
+# ------------------------------------------------------------------------------
+
+load_dotenv()
+
+TRACE_FILE = os.path.join(os.environ.get('jsons_folder', 'Jsons'), 'trace.json')
+
+SERVER = 'server'
+
+_lock = threading.Lock()
+spans = []              # [{name, node, lane, start_ns, end_ns, trace_id, args}, ...]
+clock_samples = {}      # client id -> (network_ns, offset_ns) with the least network time
+
+
+def start_trace():
+    """Drop the spans of the previous session."""
+    with _lock:
+        spans.clear()
+        clock_samples.clear()
+
+
+def get_trace_id(session_id: str, frame_key: int) -> str:
+    return f'{session_id}:{frame_key}'
+
+
+def record(name: str, start_ns: int, end_ns: int, lane: str,
+           trace_id: str = None, node: str = SERVER, **args):
+    """Records one span (wall clock nanoseconds, `time.time_ns()`)."""
+    span = {'name': name, 'node': node, 'lane': lane, 'start_ns': start_ns,
+            'end_ns': end_ns, 'trace_id': trace_id, 'args': args}
+    with _lock:
+        spans.append(span)
+
+
+class Span:
+    """with tracing.Span('store result', lane='results', trace_id=...): ..."""
+
+    def __init__(self, name: str, lane: str, trace_id: str = None, **args):
+        self.name = name
+        self.lane = lane
+        self.trace_id = trace_id
+        self.args = args
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, self.start_ns, time.time_ns(), self.lane, self.trace_id, **self.args)
+        return False
+
+
+def add_client_spans(client_id, trace: dict, sent_ns: int, received_ns: int):
+    """
+    Adds the spans sent back by a client with its result.
+
+    Args:
+        trace (dict): {'trace_id', 'received_ns', 'sent_ns', 'spans': [{name, start_ns, end_ns}]}
+            (client clock)
+        sent_ns (int): When the server started sending the frame (server clock).
+        received_ns (int): When the server got the result (server clock).
+    """
+    if not trace:
+        return
+    node = f'client {client_id}'
+
+    # Time on the network (both ways) and the client clock's offset:
+    network_ns = (received_ns - sent_ns) - (trace['sent_ns'] - trace['received_ns'])
+    offset_ns = ((trace['received_ns'] + trace['sent_ns']) - (sent_ns + received_ns)) // 2
+
+    with _lock:
+        best = clock_samples.get(node)
+        if best is None or network_ns < best[0]:
+            clock_samples[node] = (network_ns, offset_ns)
+
+        for span in trace.get('spans', []):
+            spans.append({
+                'name': span['name'], 'node': node, 'lane': span.get('lane', 'processing'),
+                'start_ns': span['start_ns'], 'end_ns': span['end_ns'],
+                'trace_id': trace.get('trace_id'), 'args': span.get('args', {})})
+
+
+def take_spans() -> list:
+    """Removes and returns the spans recorded so far (a web worker hands them to the coordinator)."""
+    with _lock:
+        taken = list(spans)
+        spans.clear()
+    return taken
+
+
+def add_spans(new_spans: list):
+    """Adds spans recorded in another process (see take_spans)."""
+    with _lock:
+        spans.extend(new_spans)
+
+
+def get_trace_events() -> list:
+    """All the spans as Chrome trace events (complete events, microseconds)."""
+    with _lock:
+        all_spans = list(spans)
+        offsets = {node: offset for node, (_, offset) in clock_samples.items()}
+
+    if not all_spans:
+        return []
+
+    # Nodes are processes and lanes are threads in the trace viewer:
+    nodes = [SERVER] + sorted({span['node'] for span in all_spans} - {SERVER})
+    pids = {node: pid for pid, node in enumerate(nodes)}
+    tids = {}
+
+    events = []
+    for node in nodes:
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pids[node],
+                       'args': {'name': node}})
+
+    origin = min(span['start_ns'] - offsets.get(span['node'], 0) for span in all_spans)
+
+    for span in all_spans:
+        lane = (span['node'], span['lane'])
+        if lane not in tids:
+            tids[lane] = len(tids) + 1
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pids[span['node']],
+                           'tid': tids[lane], 'args': {'name': span['lane']}})
+
+        offset = offsets.get(span['node'], 0)
+        args = dict(span['args'])
+        if span['trace_id'] is not None:
+            args['trace_id'] = span['trace_id']
+
+        events.append({
+            'name': span['name'], 'cat': span['node'], 'ph': 'X',
+            'ts': (span['start_ns'] - offset - origin) / 1000,
+            'dur': max(span['end_ns'] - span['start_ns'], 0) / 1000,
+            'pid': pids[span['node']], 'tid': tids[lane], 'args': args,
+        })
+    return events
+
+
+def save_trace(path: str = TRACE_FILE):
+    """Writes the merged trace of the session (server + clients)."""
+    events = get_trace_events()
+    if not events:
+        return
+
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)